@@ -1,26 +1,62 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Response
+from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
+from collections import OrderedDict, deque
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
+import re
 import json
 import io
+import tempfile
+import urllib.parse
+import ipaddress
+import socket
+import gzip
+import base64
 import httpx
+import httpcore
 import asyncio
 import logging
 import hashlib
+import hmac
 import secrets
 import time
 import random
+import heapq
+import bisect
+from abc import ABC, abstractmethod
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, DeleteMany, IndexModel, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import sys
 
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Static catalogs are served gzip or identity only
+    brotli = None
+
+try:
+    import psutil
+except ImportError:  # System metrics fall back to demo values
+    psutil = None
+
+try:
+    import ijson
+except ImportError:  # Fall back to parsing the whole body
+    ijson = None
+
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -34,6 +70,14 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ.get('DB_NAME', 'thriveremote_db')]
 
+def utc_now() -> datetime:
+    """Naive UTC time; TTL indexes read stored datetimes as UTC"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def local_to_utc(moment: datetime) -> datetime:
+    """Convert a naive local datetime to naive UTC for a TTL field"""
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
 app = FastAPI()
 
 # CORS middleware
@@ -45,6 +89,203 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request telemetry
+# Log-spaced latency bucket bounds: powers of sqrt(2) from 0.5ms to ~16s
+LATENCY_BUCKET_BOUNDS_MS = tuple(2 ** (exponent / 2) for exponent in range(-2, 29))
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram with approximate quantiles"""
+
+    __slots__ = ("counts", "count", "total_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, elapsed_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKET_BOUNDS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return LATENCY_BUCKET_BOUNDS_MS[min(index, len(LATENCY_BUCKET_BOUNDS_MS) - 1)]
+        return LATENCY_BUCKET_BOUNDS_MS[-1]
+
+    def mean(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+class RequestTelemetry:
+    """In-process request and cache aggregates.
+
+    Everything is updated from the event loop thread, so plain integer
+    counters are safe without locks.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.latency = LatencyHistogram()
+        self.route_latency: Dict[tuple, LatencyHistogram] = {}
+        self.status_counts: Dict[tuple, int] = {}
+        self.requests_total = 0
+        self.errors_total = 0
+        self.bytes_sent = 0
+        self.in_flight = 0
+        self.open_streams = 0
+        self.day = datetime.now().date()
+        self.requests_today = 0
+        self.errors_today = 0
+        self.cache_counts: Dict[tuple, int] = {}
+
+    def record_request(self, method: str, route: str, status: int, elapsed_ms: Optional[float], bytes_sent: int):
+        """Count a finished request; elapsed_ms is None for long-lived streams"""
+        today = datetime.now().date()
+        if today != self.day:
+            self.day, self.requests_today, self.errors_today = today, 0, 0
+        
+        is_error = status >= 500
+        self.requests_total += 1
+        self.requests_today += 1
+        self.errors_total += is_error
+        self.errors_today += is_error
+        self.bytes_sent += bytes_sent
+        
+        if elapsed_ms is not None:
+            self.latency.record(elapsed_ms)
+            histogram = self.route_latency.get((method, route))
+            if histogram is None:
+                histogram = self.route_latency[(method, route)] = LatencyHistogram()
+            histogram.record(elapsed_ms)
+        
+        key = (method, route, status)
+        self.status_counts[key] = self.status_counts.get(key, 0) + 1
+
+    def record_cache(self, cache: str, hit: bool):
+        key = (cache, "hit" if hit else "miss")
+        self.cache_counts[key] = self.cache_counts.get(key, 0) + 1
+
+    def cache_hit_ratio(self) -> float:
+        hits = sum(count for (_, result), count in self.cache_counts.items() if result == "hit")
+        total = sum(self.cache_counts.values())
+        return hits / total if total else 0.0
+
+    def error_rate(self) -> float:
+        return self.errors_today / self.requests_today if self.requests_today else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """Request figures in the shape the performance endpoint reports"""
+        return {
+            "api_response_time": f"{self.latency.quantile(0.5):.3g}ms",
+            "api_response_time_p95": f"{self.latency.quantile(0.95):.3g}ms",
+            "api_response_time_p99": f"{self.latency.quantile(0.99):.3g}ms",
+            "total_requests_today": self.requests_today,
+            "open_streams": self.open_streams,
+            "error_rate": f"{self.error_rate() * 100:.1f}%",
+            "cache_hit_ratio": f"{self.cache_hit_ratio() * 100:.0f}%"
+        }
+
+    def render_prometheus(self) -> str:
+        """Render aggregates in the Prometheus text exposition format"""
+        lines = [
+            "# HELP thrive_http_requests_total HTTP requests by route and status.",
+            "# TYPE thrive_http_requests_total counter"
+        ]
+        for (method, route, status), count in sorted(self.status_counts.items()):
+            lines.append(f'thrive_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+        
+        lines += [
+            "# HELP thrive_http_request_duration_seconds HTTP request latency by route.",
+            "# TYPE thrive_http_request_duration_seconds histogram"
+        ]
+        for (method, route), histogram in sorted(self.route_latency.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKET_BOUNDS_MS, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'thrive_http_request_duration_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+            lines.append(f'thrive_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"thrive_http_request_duration_seconds_sum{{{labels}}} {histogram.total_ms / 1000:.6f}")
+            lines.append(f"thrive_http_request_duration_seconds_count{{{labels}}} {histogram.count}")
+        
+        lines += [
+            "# HELP thrive_cache_requests_total Cache lookups by cache and result.",
+            "# TYPE thrive_cache_requests_total counter"
+        ]
+        for (cache, result), count in sorted(self.cache_counts.items()):
+            lines.append(f'thrive_cache_requests_total{{cache="{cache}",result="{result}"}} {count}')
+        
+        lines += [
+            "# HELP thrive_http_requests_in_flight HTTP requests currently being served.",
+            "# TYPE thrive_http_requests_in_flight gauge",
+            f"thrive_http_requests_in_flight {self.in_flight}",
+            "# HELP thrive_http_streams_open Server-sent event streams currently open.",
+            "# TYPE thrive_http_streams_open gauge",
+            f"thrive_http_streams_open {self.open_streams}",
+            "# HELP thrive_http_response_bytes_total Response body bytes sent.",
+            "# TYPE thrive_http_response_bytes_total counter",
+            f"thrive_http_response_bytes_total {self.bytes_sent}",
+            "# HELP thrive_process_uptime_seconds Seconds since this worker started.",
+            "# TYPE thrive_process_uptime_seconds gauge",
+            f"thrive_process_uptime_seconds {time.time() - self.started:.0f}"
+        ]
+        return "\n".join(lines) + "\n"
+
+telemetry = RequestTelemetry()
+
+STREAM_PATH_PREFIX = "/api/stream/"
+
+class RequestTelemetryMiddleware:
+    """ASGI middleware recording latency, status and size per route template"""
+
+    def __init__(self, app, telemetry: RequestTelemetry):
+        self.app = app
+        self.telemetry = telemetry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        status = 500
+        bytes_sent = 0
+        
+        async def send_with_telemetry(message):
+            nonlocal status, bytes_sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_sent += len(message.get("body", b""))
+            await send(message)
+        
+        # Event streams stay open for minutes; keep them out of latency and in-flight figures
+        streaming = scope["path"].startswith(STREAM_PATH_PREFIX)
+        if streaming:
+            self.telemetry.open_streams += 1
+        else:
+            self.telemetry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_telemetry)
+        finally:
+            if streaming:
+                self.telemetry.open_streams -= 1
+            else:
+                self.telemetry.in_flight -= 1
+            # The router stores the matched route in scope, giving a low-cardinality label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            elapsed_ms = None if streaming else (time.perf_counter() - started) * 1000
+            self.telemetry.record_request(scope["method"], route, status, elapsed_ms, bytes_sent)
+
+app.add_middleware(RequestTelemetryMiddleware, telemetry=telemetry)
+
 # Pydantic models
 class TrackRequest(BaseModel):
     video_id: str
@@ -67,6 +308,7 @@ class User(BaseModel):
     savings_goal: float = 5000.0
     current_savings: float = 0.0
     settings: Dict[str, Any] = {}
+    registered: bool = False
 
 class LoginRequest(BaseModel):
     username: str
@@ -146,6 +388,7 @@ class Download(BaseModel):
     file_type: str = ""
     category: str = "general"
     download_path: Optional[str] = None
+    error: Optional[str] = None
 
 class DownloadRequest(BaseModel):
     url: str
@@ -163,6 +406,7 @@ class Document(BaseModel):
     file_type: str = "text"
     tags: List[str] = []
     category: str = "general"
+    revision: int = 0
 
 class DocumentRequest(BaseModel):
     title: str
@@ -170,6 +414,18 @@ class DocumentRequest(BaseModel):
     tags: Optional[List[str]] = []
     category: Optional[str] = "general"
 
+class TextEdit(BaseModel):
+    start: int = Field(ge=0)
+    end: int = Field(ge=0)
+    text: str = ""
+
+class DocumentPatchRequest(BaseModel):
+    base_revision: int
+    edits: List[TextEdit] = []
+    title: Optional[str] = None
+    tags: Optional[List[str]] = None
+    category: Optional[str] = None
+
 # File Management Models
 class FileRecord(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -180,6 +436,7 @@ class FileRecord(BaseModel):
     file_type: str
     upload_date: datetime = Field(default_factory=datetime.now)
     file_path: str
+    sha256: Optional[str] = None
     category: str = "general"
     description: Optional[str] = ""
 
@@ -192,103 +449,457 @@ class WeatherCache(BaseModel):
     expires_at: datetime
 
 # Authentication utilities
-def hash_password(password: str) -> str:
-    """Hash password with salt"""
+PASSWORD_HASH_SCHEME = "pbkdf2_sha256"
+LEGACY_HASH_ITERATIONS = 100000
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", LEGACY_HASH_ITERATIONS))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64))
+
+# Stored for demo users, who have no password; no input ever verifies against it
+UNUSABLE_PASSWORD_HASH = "!"
+
+def _pbkdf2_digest(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+
+def _parse_password_hash(password_hash: str) -> tuple:
+    """Split a stored hash into (iterations, salt, digest), accepting the legacy 'digest:salt' format"""
+    if password_hash.startswith(PASSWORD_HASH_SCHEME + "$"):
+        _, iterations, salt, digest = password_hash.split("$")
+        return int(iterations), salt, digest
+    digest, salt = password_hash.split(':')
+    return LEGACY_HASH_ITERATIONS, salt, digest
+
+def _hash_password_sync(password: str, iterations: int) -> str:
+    """Hash password with salt (blocking, runs on the hashing executor)"""
     salt = secrets.token_hex(16)
-    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000).hex() + ':' + salt
+    return f"{PASSWORD_HASH_SCHEME}${iterations}${salt}${_pbkdf2_digest(password, salt, iterations)}"
 
-def verify_password(password: str, password_hash: str) -> bool:
-    """Verify password against hash"""
+def _verify_password_sync(password: str, password_hash: str) -> bool:
+    """Verify password against hash (blocking, runs on the hashing executor)"""
     try:
-        stored_hash, salt = password_hash.split(':')
-        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000).hex() == stored_hash
-    except:
+        iterations, salt, digest = _parse_password_hash(password_hash)
+        return hmac.compare_digest(_pbkdf2_digest(password, salt, iterations), digest)
+    except Exception:
         return False
 
+def password_needs_rehash(password_hash: str) -> bool:
+    """Check whether a stored hash was produced with outdated parameters"""
+    try:
+        iterations, _, _ = _parse_password_hash(password_hash)
+    except Exception:
+        return True
+    return not password_hash.startswith(PASSWORD_HASH_SCHEME + "$") or iterations != PASSWORD_HASH_ITERATIONS
+
+class PasswordHasher:
+    """Runs PBKDF2 off the event loop on a bounded thread pool.
+
+    hashlib releases the GIL while deriving keys, so threads give real
+    parallelism here without the pickling overhead of a process pool.
+    At most `max_workers` hashes run at once; callers beyond that wait on
+    the semaphore, and once `max_pending` calls are waiting or running new
+    ones are rejected with a 503 instead of piling up behind the pool.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, iterations: int):
+        self.iterations = iterations
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.max_workers = max_workers
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_seconds = 0.0
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Password hashing service is busy, please retry",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        try:
+            async with self.semaphore:
+                self.running += 1
+                started = time.perf_counter()
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+                finally:
+                    self.running -= 1
+                    self.completed += 1
+                    self.total_seconds += time.perf_counter() - started
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash password with the current parameters"""
+        return await self._run(_hash_password_sync, password, self.iterations)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        """Verify password against hash"""
+        if not password_hash or password_hash.startswith(UNUSABLE_PASSWORD_HASH):
+            return False
+        return await self._run(_verify_password_sync, password, password_hash)
+
+    async def verify_and_rehash(self, password: str, password_hash: str) -> tuple:
+        """Verify password and return (valid, new_hash) where new_hash is set if parameters changed"""
+        if not await self.verify(password, password_hash):
+            return False, None
+        if not password_needs_rehash(password_hash):
+            return True, None
+        self.rehashed += 1
+        return True, await self.hash(password)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters for monitoring"""
+        return {
+            "workers": self.max_workers,
+            "iterations": self.iterations,
+            "running": self.running,
+            "queued": self.pending - self.running,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_hash_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else 0.0
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_ITERATIONS)
+
 def generate_session_token() -> str:
     """Generate secure session token"""
     return secrets.token_urlsafe(32)
 
 # Session management
-active_sessions = {}
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "tiered")
+SESSION_TTL = timedelta(hours=float(os.environ.get("SESSION_TTL_HOURS", 24)))
+SESSION_MAX_MEMORY_ENTRIES = int(os.environ.get("SESSION_MAX_MEMORY_ENTRIES", 100000))
+SESSION_LRU_ENTRIES = int(os.environ.get("SESSION_LRU_ENTRIES", 10000))
+SESSION_LRU_TTL_SECONDS = float(os.environ.get("SESSION_LRU_TTL_SECONDS", 30))
+SESSION_TOUCH_INTERVAL = timedelta(seconds=float(os.environ.get("SESSION_TOUCH_INTERVAL_SECONDS", 60)))
+
+class SessionStore(ABC):
+    """Base class for session backends"""
+
+    @abstractmethod
+    async def create(self, token: str, session: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def delete(self, token: str):
+        ...
+
+class MemorySessionStore(SessionStore):
+    """Single-process store that evicts by expiry heap and caps its size"""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.expiry_heap: List[tuple] = []
+
+    def _evict(self):
+        now = utc_now()
+        heap = self.expiry_heap
+        while heap and (heap[0][0] <= now or len(self.sessions) > self.max_sessions):
+            expires_at, token = heapq.heappop(heap)
+            session = self.sessions.get(token)
+            # Skip heap entries left behind by deleted sessions
+            if session and session["expires_at"] == expires_at:
+                del self.sessions[token]
+        if len(heap) > 2 * max(len(self.sessions), 1024):
+            self.expiry_heap = [(session["expires_at"], token) for token, session in self.sessions.items()]
+            heapq.heapify(self.expiry_heap)
+
+    async def create(self, token: str, session: Dict[str, Any]):
+        self.sessions[token] = session
+        heapq.heappush(self.expiry_heap, (session["expires_at"], token))
+        self._evict()
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        session = self.sessions.get(token)
+        if session and session["expires_at"] > utc_now():
+            session["last_used"] = utc_now()
+            return session
+        return None
+
+    async def delete(self, token: str):
+        self.sessions.pop(token, None)
+
+class MongoSessionStore(SessionStore):
+    """Shared store for multi-worker deployments, expired by a TTL index"""
+
+    def __init__(self, collection, touch_interval: timedelta):
+        self.collection = collection
+        self.touch_interval = touch_interval
+
+    async def create(self, token: str, session: Dict[str, Any]):
+        await self.collection.insert_one({"token": token, **session})
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        now = utc_now()
+        session = await self.collection.find_one({"token": token, "expires_at": {"$gt": now}}, {"_id": 0})
+        if session and now - session.get("last_used", now) > self.touch_interval:
+            # Throttle last_used writes so reads don't turn into writes
+            await self.collection.update_one({"token": token}, {"$set": {"last_used": now}})
+            session["last_used"] = now
+        return session
+
+    async def delete(self, token: str):
+        await self.collection.delete_one({"token": token})
+
+class TieredSessionStore(SessionStore):
+    """Small per-process LRU in front of a shared store.
+
+    Local entries are trusted for `local_ttl` seconds, which bounds how long
+    a logout on another worker can go unnoticed here.
+    """
+
+    def __init__(self, backing: SessionStore, max_entries: int, local_ttl: float):
+        self.backing = backing
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.local: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _remember(self, token: str, session: Dict[str, Any]):
+        self.local[token] = (time.monotonic(), session)
+        self.local.move_to_end(token)
+        while len(self.local) > self.max_entries:
+            self.local.popitem(last=False)
+
+    async def create(self, token: str, session: Dict[str, Any]):
+        await self.backing.create(token, session)
+        self._remember(token, session)
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self.local.get(token)
+        if entry and time.monotonic() - entry[0] < self.local_ttl and entry[1]["expires_at"] > utc_now():
+            self.local.move_to_end(token)
+            telemetry.record_cache("session", True)
+            return entry[1]
+        
+        telemetry.record_cache("session", False)
+        session = await self.backing.get(token)
+        if session:
+            self._remember(token, session)
+        else:
+            self.local.pop(token, None)
+        return session
+
+    async def delete(self, token: str):
+        self.local.pop(token, None)
+        await self.backing.delete(token)
+
+def create_session_store(backend: str) -> SessionStore:
+    """Build the session store selected by SESSION_BACKEND"""
+    if backend == "memory":
+        return MemorySessionStore(SESSION_MAX_MEMORY_ENTRIES)
+    mongo_store = MongoSessionStore(db.sessions, SESSION_TOUCH_INTERVAL)
+    if backend == "mongo":
+        return mongo_store
+    if backend == "tiered":
+        return TieredSessionStore(mongo_store, SESSION_LRU_ENTRIES, SESSION_LRU_TTL_SECONDS)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+session_store = create_session_store(SESSION_BACKEND)
 
-def create_session(user_id: str) -> str:
+async def create_session(user_id: str) -> str:
     """Create new session for user"""
     token = generate_session_token()
-    expires_at = datetime.now() + timedelta(hours=24)
+    # Session times are UTC so the TTL index expires them on time
+    now = utc_now()
     
-    active_sessions[token] = {
+    await session_store.create(token, {
         "user_id": user_id,
-        "created_at": datetime.now(),
-        "last_used": datetime.now(),
-        "expires_at": expires_at
-    }
+        "created_at": now,
+        "last_used": now,
+        "expires_at": now + SESSION_TTL
+    })
     
     return token
 
-def get_user_from_session(token: str) -> Optional[str]:
+async def get_user_from_session(token: str) -> Optional[str]:
     """Get user ID from session token"""
     if not token:
         return None
-        
-    session = active_sessions.get(token)
-    if session and session["expires_at"] > datetime.now():
-        session["last_used"] = datetime.now()
-        return session["user_id"]
     
-    return None
+    session = await session_store.get(token)
+    return session["user_id"] if session else None
 
-# Helper function to convert MongoDB documents to JSON-serializable format
-def convert_mongo_doc(doc):
-    """Convert MongoDB document to JSON serializable format"""
-    if doc is None:
-        return None
+# Fast JSON responses for MongoDB documents
+def _encode_bson_value(value):
+    """Encode the BSON types a JSON encoder doesn't know natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps_json(content: Any) -> bytes:
+    """Encode content, including BSON values, to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_encode_bson_value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_encode_bson_value, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response that encodes MongoDB documents in a single pass.
+
+    Returning this directly from a handler bypasses FastAPI's
+    jsonable_encoder, so documents are walked once by the native encoder
+    instead of being copied by hand and then re-walked. Queries feeding it
+    should project out `_id`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+# Cursor pagination for per-user list endpoints
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", 100))
+LIST_MAX_PAGE_SIZE = int(os.environ.get("LIST_MAX_PAGE_SIZE", 100))
+DOCUMENT_SUMMARY_FIELDS = ("title", "tags", "category", "file_type", "created_date", "modified_date")
+
+def encode_page_cursor(sort_value: Any, doc_id: str) -> str:
+    """Encode the (sort value, id) of the last returned item as an opaque cursor"""
+    is_datetime = isinstance(sort_value, datetime)
+    payload = [sort_value.isoformat() if is_datetime else sort_value, is_datetime, doc_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_page_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by encode_page_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, is_datetime, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        if is_datetime:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, str(doc_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def build_list_projection(fields: Optional[str], allowed: set, sort_field: str, default_fields: Optional[tuple] = None) -> Dict[str, int]:
+    """Turn a comma-separated `fields` parameter into a Mongo projection"""
+    requested = [field.strip() for field in fields.split(",") if field.strip()] if fields else default_fields
+    if not requested:
+        return {"_id": 0}
     
-    if isinstance(doc, list):
-        return [convert_mongo_doc(item) for item in doc]
-    
-    if isinstance(doc, dict):
-        converted = {}
-        for key, value in doc.items():
-            if key == '_id':
-                continue  # Skip MongoDB _id field
-            elif isinstance(value, ObjectId):
-                converted[key] = str(value)
-            elif isinstance(value, datetime):
-                converted[key] = value.isoformat()
-            elif isinstance(value, dict):
-                converted[key] = convert_mongo_doc(value)
-            elif isinstance(value, list):
-                converted[key] = convert_mongo_doc(value)
-            else:
-                converted[key] = value
-        return converted
+    unknown = set(requested) - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    
+    # The cursor always needs the sort key and id
+    projection = {"_id": 0, "id": 1, sort_field: 1}
+    projection.update({field: 1 for field in requested})
+    return projection
+
+async def paginate_user_collection(collection, user_id: str, sort_field: str, limit: int,
+                                   cursor: Optional[str], projection: Dict[str, int]) -> tuple:
+    """Fetch one page newest-first using a (sort_field, id) keyset cursor.
     
-    return doc
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, LIST_MAX_PAGE_SIZE))
+    query: Dict[str, Any] = {"user_id": user_id}
+    if cursor:
+        sort_value, last_id = decode_page_cursor(cursor)
+        query["$or"] = [
+            {sort_field: {"$lt": sort_value}},
+            {sort_field: sort_value, "id": {"$lt": last_id}}
+        ]
+    
+    items = await collection.find(query, projection).sort(
+        [(sort_field, DESCENDING), ("id", DESCENDING)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(items) <= limit:
+        return items, None
+    
+    items = items[:limit]
+    return items, encode_page_cursor(items[-1].get(sort_field), items[-1]["id"])
 
 # Helper function to get user from session (optional for demo)
-def get_current_user(session_token: str = None):
+async def get_current_user(session_token: str = None):
     """Dependency to get current user from session (optional for demo)"""
     if not session_token:
         return "demo_user"  # Default demo user
     
-    user_id = get_user_from_session(session_token)
+    user_id = await get_user_from_session(session_token)
     if not user_id:
         return "demo_user"  # Fallback to demo user
     
     return user_id
 
+# Per-process user cache
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", 10))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", 5000))
+
+class UserCache:
+    """Short-lived LRU of user documents keyed by user id.
+
+    Writers that change a user document call `invalidate` so this worker
+    never serves its own stale writes; other workers converge within the TTL.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        entry = self.entries.get(user_id)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            telemetry.record_cache("user", True)
+            return entry[1]
+        if entry:
+            del self.entries[user_id]
+        self.misses += 1
+        telemetry.record_cache("user", False)
+        return None
+
+    def set(self, user_id: str, user: Dict):
+        self.entries[user_id] = (time.monotonic(), user)
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self.entries.pop(user_id, None)
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
 # Enhanced content management functions
 async def get_or_create_user(user_id: str) -> Dict:
     """Get or create user with enhanced MongoDB integration"""
-    user = await db.users.find_one({"id": user_id})
+    today = datetime.now().date().isoformat()
     
-    if not user:
+    user = user_cache.get(user_id)
+    if user and user.get("last_streak_date") == today:
+        return user
+    
+    # One round trip: records the day's activity or is a no-op
+    user = await update_user_activity(user_id)
+    if user:
+        achievement_engine.observe(user_id, user_achievement_gauges(user))
+    else:
         user_data = {
             "id": user_id,
             "username": f"User_{user_id[-6:]}",
             "email": None,
-            "password_hash": hash_password("default_password"),
+            "password_hash": UNUSABLE_PASSWORD_HASH,
             "created_date": datetime.now(),
             "last_active": datetime.now(),
             "total_sessions": 1,
@@ -304,321 +915,1278 @@ async def get_or_create_user(user_id: str) -> Dict:
             "easter_eggs_found": 0
         }
         
-        await db.users.insert_one(user_data)
-        
-        # Initialize default achievements
-        await initialize_achievements(user_id)
+        # Concurrent first requests for the same user race on the upsert
+        try:
+            result = await db.users.update_one({"id": user_id}, {"$setOnInsert": user_data}, upsert=True)
+            created = result.upserted_id is not None
+        except DuplicateKeyError:
+            created = False
         
-        user = user_data
-    else:
-        # Update last active and check streak
-        await update_user_activity(user_id)
+        if created:
+            # Initialize default achievements
+            await initialize_achievements(user_id)
+            user = user_data
+        else:
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
     
+    user_cache.set(user_id, user)
     return user
 
-async def update_user_activity(user_id: str):
-    """Update user activity and daily streak"""
+async def update_user_activity(user_id: str) -> Optional[Dict]:
+    """Record the user's first activity of the day and return the user.
+    
+    One round trip either way: on a later visit the same day every field
+    keeps its value, so Mongo treats the update as a no-op. Returns None
+    when the user does not exist.
+    """
     now = datetime.now()
     today = now.date().isoformat()
+    yesterday = (now.date() - timedelta(days=1)).isoformat()
+    new_day = {"$ne": ["$last_streak_date", today]}
     
-    user = await db.users.find_one({"id": user_id})
+    # Continue the streak if the user was active yesterday, otherwise reset it
+    return await db.users.find_one_and_update(
+        {"id": user_id},
+        [{"$set": {
+            "last_active": {"$cond": [new_day, now, "$last_active"]},
+            "daily_streak": {"$cond": [
+                new_day,
+                {"$cond": [
+                    {"$eq": ["$last_streak_date", yesterday]},
+                    {"$add": [{"$ifNull": ["$daily_streak", 0]}, 1]},
+                    1
+                ]},
+                "$daily_streak"
+            ]},
+            "total_sessions": {"$cond": [
+                new_day, {"$add": [{"$ifNull": ["$total_sessions", 0]}, 1]}, "$total_sessions"
+            ]},
+            "last_streak_date": today
+        }}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+# Productivity write-behind buffer
+PRODUCTIVITY_FLUSH_INTERVAL_SECONDS = float(os.environ.get("PRODUCTIVITY_FLUSH_INTERVAL_SECONDS", 1.0))
+PRODUCTIVITY_FLUSH_BATCH_SIZE = int(os.environ.get("PRODUCTIVITY_FLUSH_BATCH_SIZE", 500))
+PRODUCTIVITY_MAX_PENDING = int(os.environ.get("PRODUCTIVITY_MAX_PENDING", 10000))
+PRODUCTIVITY_ROLLUP_RETENTION = {
+    "minute": timedelta(hours=float(os.environ.get("PRODUCTIVITY_MINUTE_ROLLUP_HOURS", 48))),
+    "hour": timedelta(days=float(os.environ.get("PRODUCTIVITY_HOUR_ROLLUP_DAYS", 90))),
+    "day": None
+}
+
+def rollup_bucket(timestamp: datetime, granularity: str) -> datetime:
+    """Start of the minute, hour or day containing `timestamp`"""
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def accumulate_rollups(rollups: Dict[tuple, Dict], user_id: str, timestamp: datetime, action: str, points: int):
+    """Count one action into its minute, hour and day buckets"""
+    for granularity in PRODUCTIVITY_ROLLUP_RETENTION:
+        key = (user_id, granularity, rollup_bucket(timestamp, granularity))
+        bucket = rollups.setdefault(key, {"points": 0, "actions": 0, "by_action": {}})
+        bucket["points"] += points
+        bucket["actions"] += 1
+        bucket["by_action"][action] = bucket["by_action"].get(action, 0) + 1
+
+def merge_rollups(target: Dict[tuple, Dict], source: Dict[tuple, Dict]):
+    for key, totals in source.items():
+        bucket = target.setdefault(key, {"points": 0, "actions": 0, "by_action": {}})
+        bucket["points"] += totals["points"]
+        bucket["actions"] += totals["actions"]
+        for action, count in totals["by_action"].items():
+            bucket["by_action"][action] = bucket["by_action"].get(action, 0) + count
+
+def rollup_operations(rollups: Dict[tuple, Dict], batch: Optional[str] = None) -> List[UpdateOne]:
+    """Upserts adding buffered totals into productivity_rollups.
     
-    if user:
-        last_streak_date = user.get("last_streak_date")
-        daily_streak = user.get("daily_streak", 0)
-        
-        if last_streak_date != today:
-            yesterday = (now.date() - timedelta(days=1)).isoformat()
-            if last_streak_date == yesterday:
-                # Continue streak
-                daily_streak += 1
-            else:
-                # Reset streak
-                daily_streak = 1
+    With a compaction batch id each bucket records the batch and skips it
+    if it was already added.
+    """
+    operations = []
+    for (user_id, granularity, bucket), totals in rollups.items():
+        retention = PRODUCTIVITY_ROLLUP_RETENTION[granularity]
+        increments = {"points": totals["points"], "actions": totals["actions"]}
+        increments.update({f"by_action.{action}": count for action, count in totals["by_action"].items()})
+        selector = {"user_id": user_id, "granularity": granularity, "bucket": bucket}
+        update = {"$inc": increments, "$setOnInsert": {"expires_at": local_to_utc(bucket + retention) if retention else None}}
+        if batch is not None:
+            selector["folded_batches"] = {"$ne": batch}
+            update["$push"] = {"folded_batches": batch}
+        operations.append(UpdateOne(selector, update, upsert=True))
+    return operations
+
+class PeriodicTask:
+    """Runs `work` on a background task every `interval` seconds.
+
+    Failures are logged and the loop carries on. `run_first` runs the work
+    before the first wait, and `wait` replaces the plain sleep for loops
+    that can also be woken early. close() cancels the task and waits for
+    it to finish, so owners can do their final flush straight after.
+    """
+
+    def __init__(self, name: str, work, interval: float = 0, run_first: bool = False, wait=None):
+        self.name = name
+        self.work = work
+        self.interval = interval
+        self.run_first = run_first
+        self.wait = wait
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        if self.run_first:
+            await self._step()
+        while True:
+            await (self.wait() if self.wait else asyncio.sleep(self.interval))
+            await self._step()
+
+    async def _step(self):
+        try:
+            await self.work()
+        except Exception as e:
+            logger.error(f"{self.name} failed: {e}")
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+class ProductivityWriteBuffer:
+    """Coalesces productivity logs and point increments into batched writes.
+
+    Logs are flushed with one insert_many and point increments are merged
+    per user into one bulk_write, either every `flush_interval` seconds or
+    as soon as `batch_size` logs are waiting. Minute, hour and day rollups
+    are merged the same way. If Mongo falls behind and `max_pending` logs
+    pile up, callers flush inline as backpressure.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int, max_pending: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.logs: List[Dict] = []
+        self.points: Dict[str, int] = {}
+        self.rollups: Dict[tuple, Dict] = {}
+        self.flush_lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.loop = PeriodicTask("Productivity flush", self.flush, wait=self._wait)
+        self.enqueued = 0
+        self.flushed_logs = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        self.loop.start()
+
+    async def add(self, log: Dict):
+        self.logs.append(log)
+        self.points[log["user_id"]] = self.points.get(log["user_id"], 0) + log["points"]
+        accumulate_rollups(self.rollups, log["user_id"], log["timestamp"], log["action"], log["points"])
+        self.enqueued += 1
+        
+        if len(self.logs) >= self.max_pending:
+            await self.flush()
+        elif len(self.logs) >= self.batch_size:
+            self.wakeup.set()
+
+    async def _wait(self):
+        """Sleep until the next interval or until a full batch is waiting"""
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        self.wakeup.clear()
+
+    async def flush(self):
+        async with self.flush_lock:
+            if not self.logs and not self.points and not self.rollups:
+                return
             
-            await db.users.update_one(
-                {"id": user_id},
-                {"$set": {
-                    "last_active": now,
-                    "daily_streak": daily_streak,
-                    "last_streak_date": today
-                }, "$inc": {"total_sessions": 1}}
-            )
+            logs, self.logs = self.logs, []
+            points, self.points = self.points, {}
+            rollups, self.rollups = self.rollups, {}
+            started = time.perf_counter()
+            
+            if logs:
+                try:
+                    await db.productivity_logs.insert_many(logs, ordered=False)
+                    self.flushed_logs += len(logs)
+                except BulkWriteError as e:
+                    # Duplicate keys mean a retried log already landed
+                    failed = [logs[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                    self.flushed_logs += len(logs) - len(failed)
+                    self._requeue_logs(failed)
+                    logger.error(f"Productivity log flush partially failed: {len(failed)} logs requeued")
+                except Exception as e:
+                    self._requeue_logs(logs)
+                    logger.error(f"Productivity log flush failed: {e}")
+            
+            if points:
+                user_ids = [user_id for user_id, increment in points.items() if increment]
+                operations = [
+                    UpdateOne({"id": user_id}, {"$inc": {"productivity_score": points[user_id]}})
+                    for user_id in user_ids
+                ]
+                try:
+                    if operations:
+                        await db.users.bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    self.failures += 1
+                    failed = {user_ids[err["index"]] for err in e.details.get("writeErrors", [])}
+                    for user_id in failed:
+                        self.points[user_id] = self.points.get(user_id, 0) + points[user_id]
+                    logger.error(f"Productivity score flush partially failed: {len(failed)} users requeued")
+                except Exception as e:
+                    self.failures += 1
+                    for user_id, increment in points.items():
+                        self.points[user_id] = self.points.get(user_id, 0) + increment
+                    logger.error(f"Productivity score flush failed: {e}")
+                for user_id in points:
+                    user_cache.invalidate(user_id)
+            
+            if rollups:
+                keys = list(rollups)
+                try:
+                    await db.productivity_rollups.bulk_write(rollup_operations(rollups), ordered=False)
+                except BulkWriteError as e:
+                    self.failures += 1
+                    failed = {keys[err["index"]] for err in e.details.get("writeErrors", [])}
+                    merge_rollups(self.rollups, {key: rollups[key] for key in failed})
+                    logger.error(f"Productivity rollup flush partially failed: {len(failed)} buckets requeued")
+                except Exception as e:
+                    self.failures += 1
+                    merge_rollups(self.rollups, rollups)
+                    logger.error(f"Productivity rollup flush failed: {e}")
+            
+            self.flushes += 1
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    def _requeue_logs(self, logs: List[Dict]):
+        self.failures += 1
+        self.logs = logs + self.logs
+
+    async def close(self):
+        """Stop the flush loop and drain everything still buffered"""
+        await self.loop.close()
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_logs": len(self.logs),
+            "pending_users": len(self.points),
+            "pending_rollups": len(self.rollups),
+            "enqueued": self.enqueued,
+            "flushed_logs": self.flushed_logs,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
+
+productivity_buffer = ProductivityWriteBuffer(
+    PRODUCTIVITY_FLUSH_INTERVAL_SECONDS, PRODUCTIVITY_FLUSH_BATCH_SIZE, PRODUCTIVITY_MAX_PENDING
+)
 
 async def log_productivity_action(user_id: str, action: str, points: int, metadata: Dict = {}):
-    """Log user productivity action and award points"""
-    log_id = str(uuid.uuid4())
-    
-    # Insert productivity log
-    await db.productivity_logs.insert_one({
-        "id": log_id,
+    """Log user productivity action and award points (written behind)"""
+    await productivity_buffer.add({
+        "id": str(uuid.uuid4()),
         "user_id": user_id,
         "action": action,
         "timestamp": datetime.now(),
         "points": points,
-        "metadata": metadata
+        "metadata": metadata,
+        "rolled_up": True
     })
-    
-    # Update user productivity score
-    await db.users.update_one(
-        {"id": user_id},
-        {"$inc": {"productivity_score": points}}
-    )
 
-async def initialize_achievements(user_id: str):
-    """Initialize achievement system for user"""
-    default_achievements = [
-        {
-            "id": "first_job_apply",
-            "user_id": user_id,
-            "achievement_type": "job_application",
-            "title": "First Step",
-            "description": "Applied to your first job",
-            "icon": "🎯",
-            "unlocked": False
-        },
-        {
-            "id": "savings_milestone_25",
-            "user_id": user_id,
-            "achievement_type": "savings",
-            "title": "Quarter Way There",
-            "description": "Reached 25% of savings goal",
-            "icon": "💰",
-            "unlocked": False
-        },
-        {
-            "id": "savings_milestone_50",
-            "user_id": user_id,
-            "achievement_type": "savings",
-            "title": "Halfway Hero",
-            "description": "Reached 50% of savings goal",
-            "icon": "💎",
-            "unlocked": False
-        },
-        {
-            "id": "task_master",
-            "user_id": user_id,
-            "achievement_type": "tasks",
-            "title": "Task Master",
-            "description": "Completed 10 tasks",
-            "icon": "✅",
-            "unlocked": False
-        },
-        {
-            "id": "terminal_ninja",
-            "user_id": user_id,
-            "achievement_type": "terminal",
-            "title": "Terminal Ninja",
-            "description": "Executed 50 terminal commands",
-            "icon": "⚡",
-            "unlocked": False
-        },
-        {
-            "id": "pong_champion",
-            "user_id": user_id,
-            "achievement_type": "gaming",
-            "title": "Pong Champion",
-            "description": "Score 200 points in Pong",
-            "icon": "🏆",
-            "unlocked": False
-        },
-        {
-            "id": "easter_hunter",
-            "user_id": user_id,
-            "achievement_type": "easter_eggs",
-            "title": "Easter Egg Hunter",
-            "description": "Found 5 easter eggs",
-            "icon": "🥚",
-            "unlocked": False
-        },
-        {
-            "id": "streak_week",
-            "user_id": user_id,
-            "achievement_type": "streak",
-            "title": "Weekly Warrior",
-            "description": "Maintained 7-day streak",
-            "icon": "🔥",
-            "unlocked": False
-        }
-    ]
-    
-    for achievement in default_achievements:
-        existing = await db.achievements.find_one({"id": achievement["id"], "user_id": user_id})
-        if not existing:
-            await db.achievements.insert_one(achievement)
+# Raw productivity log retention
+PRODUCTIVITY_LOG_RETENTION_DAYS = float(os.environ.get("PRODUCTIVITY_LOG_RETENTION_DAYS", 30))
+PRODUCTIVITY_COMPACTION_INTERVAL_SECONDS = float(os.environ.get("PRODUCTIVITY_COMPACTION_INTERVAL_SECONDS", 3600))
 
-# Job fetching service
-class JobFetchingService:
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
-    
-    async def fetch_remotive_jobs(self) -> List[Dict]:
-        """Fetch real jobs from Remotive API"""
-        try:
-            response = await self.client.get('https://remotive.io/api/remote-jobs')
-            response.raise_for_status()
-            data = response.json()
-            
-            jobs = []
-            for job in data.get('jobs', [])[:25]:  # Limit to 25 recent jobs
-                normalized_job = {
-                    "id": str(uuid.uuid4()),
-                    "title": job.get('title', ''),
-                    "company": job.get('company_name', ''),
-                    "location": job.get('candidate_required_location', 'Remote'),
-                    "salary": self._format_salary(job.get('salary')),
-                    "type": job.get('job_type', 'Full-time'),
-                    "description": job.get('description', '')[:500] + "..." if job.get('description') else '',
-                    "skills": job.get('tags', [])[:5],
-                    "posted_date": job.get('publication_date', datetime.now()),
-                    "application_status": "not_applied",
-                    "source": "Remotive",
-                    "url": job.get('url', '')
-                }
-                jobs.append(normalized_job)
-            
-            return jobs
-        except Exception as e:
-            logger.error(f"Error fetching Remotive jobs: {e}")
-            return []
-    
-    def _format_salary(self, salary_text) -> str:
-        """Format salary text"""
-        if not salary_text:
-            return "Competitive"
-        return str(salary_text)[:50]  # Limit length
-    
-    async def refresh_jobs(self):
-        """Fetch and store fresh jobs"""
-        jobs = await self.fetch_remotive_jobs()
+class ProductivityLogCompactor:
+    """Applies the raw productivity log retention policy.
+
+    Logs written since rollups existed were counted into their buckets when
+    they were buffered, so past the retention window they are just deleted.
+    Older logs that predate rollups are first stamped and folded into day
+    buckets, the only granularity still retained at that age. Each bucket
+    lists the batches folded into it, so a run interrupted before the
+    delete can be repeated safely.
+    """
+
+    def __init__(self, interval: float, retention: timedelta):
+        self.interval = interval
+        self.retention = retention
+        self.loop = PeriodicTask("Productivity log compaction", self.compact, interval, run_first=True)
+        self.compacted = 0
+        self.folded = 0
+
+    def start(self):
+        self.loop.start()
+
+    async def compact(self) -> int:
+        cutoff = datetime.now() - self.retention
+        await db.productivity_logs.update_many(
+            {"timestamp": {"$lt": cutoff}, "rolled_up": {"$ne": True}, "compaction_batch": {"$exists": False}},
+            {"$set": {"compaction_batch": str(uuid.uuid4())}}
+        )
         
-        if jobs:
-            # Clear old jobs and insert new ones
-            await db.jobs.delete_many({"source": "Remotive"})
-            
-            for job in jobs:
-                await db.jobs.insert_one(job)
-            
-            logger.info(f"Refreshed {len(jobs)} jobs from Remotive")
+        # Batches left behind by an interrupted run are folded again by id;
+        # the per-bucket guard in _fold skips buckets that already have them
+        deleted = 0
+        for batch in await db.productivity_logs.distinct("compaction_batch", {"compaction_batch": {"$exists": True}}):
+            await self._fold(batch)
+            deleted += (await db.productivity_logs.delete_many({"compaction_batch": batch})).deleted_count
         
-        return len(jobs)
-    
+        result = await db.productivity_logs.delete_many({"timestamp": {"$lt": cutoff}, "rolled_up": True})
+        deleted += result.deleted_count
+        self.compacted += deleted
+        if deleted:
+            logger.info(f"Compacted {deleted} productivity logs older than {cutoff.date()}")
+        return deleted
+
+    async def _fold(self, batch: str):
+        """Add one stamped batch to its day buckets, at most once per bucket"""
+        groups = await db.productivity_logs.aggregate([
+            {"$match": {"compaction_batch": batch}},
+            {"$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "action": "$action",
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+                },
+                "points": {"$sum": "$points"},
+                "count": {"$sum": 1}
+            }}
+        ]).to_list(None)
+        if not groups:
+            return
+        
+        day_rollups: Dict[tuple, Dict] = {}
+        for group in groups:
+            key = (group["_id"]["user_id"], "day", datetime.strptime(group["_id"]["day"], "%Y-%m-%d"))
+            merge_rollups(day_rollups, {key: {
+                "points": group["points"],
+                "actions": group["count"],
+                "by_action": {group["_id"]["action"]: group["count"]}
+            }})
+        
+        # A bucket that already lists the batch fails the filter, and the
+        # upsert then collides with the unique bucket index instead of adding twice
+        try:
+            await db.productivity_rollups.bulk_write(rollup_operations(day_rollups, batch), ordered=False)
+        except BulkWriteError as e:
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+        self.folded += sum(group["count"] for group in groups)
+
     async def close(self):
-        await self.client.aclose()
+        await self.loop.close()
 
-job_service = JobFetchingService()
+productivity_compactor = ProductivityLogCompactor(
+    PRODUCTIVITY_COMPACTION_INTERVAL_SECONDS, timedelta(days=PRODUCTIVITY_LOG_RETENTION_DAYS)
+)
 
-# API Routes
-@app.get("/api/")
-async def read_root():
-    return {
-        "message": "ThriveRemoteOS API v5.5 - AI Job Entertainment Platform",
-        "timestamp": datetime.now().isoformat(),
-        "features": ["ai_job_links_portal", "desktop_environment", "virtual_pets", "ai_jobs", "entertainment_hub", "noir_aesthetic"],
-        "music_system": "luxury_fallback_playlist",
-        "new_in_v55": ["AI Job Links Portal", "Enhanced Entertainment", "25+ AI Job Platforms"]
+# Default achievement catalog, seeded for every new user
+ACHIEVEMENT_CATALOG = (
+    {
+        "id": "first_job_apply",
+        "achievement_type": "job_application",
+        "title": "First Step",
+        "description": "Applied to your first job",
+        "icon": "🎯",
+        "unlocked": False
+    },
+    {
+        "id": "savings_milestone_25",
+        "achievement_type": "savings",
+        "title": "Quarter Way There",
+        "description": "Reached 25% of savings goal",
+        "icon": "💰",
+        "unlocked": False
+    },
+    {
+        "id": "savings_milestone_50",
+        "achievement_type": "savings",
+        "title": "Halfway Hero",
+        "description": "Reached 50% of savings goal",
+        "icon": "💎",
+        "unlocked": False
+    },
+    {
+        "id": "task_master",
+        "achievement_type": "tasks",
+        "title": "Task Master",
+        "description": "Completed 10 tasks",
+        "icon": "✅",
+        "unlocked": False
+    },
+    {
+        "id": "terminal_ninja",
+        "achievement_type": "terminal",
+        "title": "Terminal Ninja",
+        "description": "Executed 50 terminal commands",
+        "icon": "⚡",
+        "unlocked": False
+    },
+    {
+        "id": "pong_champion",
+        "achievement_type": "gaming",
+        "title": "Pong Champion",
+        "description": "Score 200 points in Pong",
+        "icon": "🏆",
+        "unlocked": False
+    },
+    {
+        "id": "easter_hunter",
+        "achievement_type": "easter_eggs",
+        "title": "Easter Egg Hunter",
+        "description": "Found 5 easter eggs",
+        "icon": "🥚",
+        "unlocked": False
+    },
+    {
+        "id": "streak_week",
+        "achievement_type": "streak",
+        "title": "Weekly Warrior",
+        "description": "Maintained 7-day streak",
+        "icon": "🔥",
+        "unlocked": False
     }
+)
 
-# Music API Endpoints (Fallback System - No YouTube API Required)
-@app.get("/api/music/playlist")
-async def get_music_playlist():
-    """Get the curated luxury music playlist"""
+async def initialize_achievements(user_id: str):
+    """Initialize achievement system for user in one idempotent batch"""
+    operations = [
+        UpdateOne(
+            {"user_id": user_id, "id": achievement["id"]},
+            {"$setOnInsert": {**achievement, "user_id": user_id}},
+            upsert=True
+        )
+        for achievement in ACHIEVEMENT_CATALOG
+    ]
+    
     try:
-        # Luxury curated playlist with high-quality tracks
-        playlist = [
-            {
-                "id": "luxury_001",
-                "title": "Noir Nights",
-                "artist": "Sophisticated Beats",
-                "album": "Luxury Collection",
-                "duration": "4:23",
-                "cover": "https://images.unsplash.com/photo-1493225457124-a3eb161ffa5f?w=300&h=300&fit=crop",
-                "source": "Luxury Audio",
-                "audio_url": "https://www.soundjay.com/misc/sounds/bell-ringing-05.wav"
-            },
-            {
-                "id": "luxury_002", 
-                "title": "Golden Hour",
-                "artist": "Ambient Noir",
-                "album": "Fashion Week",
-                "duration": "3:45",
-                "cover": "https://images.unsplash.com/photo-1470225620780-dba8ba36b745?w=300&h=300&fit=crop",
-                "source": "Luxury Audio",
-                "audio_url": "https://www.soundjay.com/misc/sounds/bell-ringing-05.wav"
-            },
-            {
-                "id": "luxury_003",
-                "title": "Champagne Dreams",
-                "artist": "Luxe Vibes",
-                "album": "High Fashion",
-                "duration": "5:12",
-                "cover": "https://images.unsplash.com/photo-1493225457124-a3eb161ffa5f?w=300&h=300&fit=crop",
-                "source": "Luxury Audio",
-                "audio_url": "https://www.soundjay.com/misc/sounds/bell-ringing-05.wav"
-            },
-            {
-                "id": "luxury_004",
-                "title": "Velvet Touch",
-                "artist": "Noir Symphony",
-                "album": "Sophisticated Sound",
-                "duration": "4:07",
-                "cover": "https://images.unsplash.com/photo-1470225620780-dba8ba36b745?w=300&h=300&fit=crop",
-                "source": "Luxury Audio",
-                "audio_url": "https://www.soundjay.com/misc/sounds/bell-ringing-05.wav"
-            },
-            {
-                "id": "luxury_005",
-                "title": "Midnight Elegance",
-                "artist": "Fashion Sounds",
-                "album": "Couture Collection",
-                "duration": "3:56",
-                "cover": "https://images.unsplash.com/photo-1493225457124-a3eb161ffa5f?w=300&h=300&fit=crop",
-                "source": "Luxury Audio",
-                "audio_url": "https://www.soundjay.com/misc/sounds/bell-ringing-05.wav"
-            }
-        ]
+        await db.achievements.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # A concurrent request seeding the same user wins the unique index race
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+# Achievement rules engine
+ACHIEVEMENT_FLUSH_INTERVAL_SECONDS = float(os.environ.get("ACHIEVEMENT_FLUSH_INTERVAL_SECONDS", 1.0))
+ACHIEVEMENT_KNOWN_UNLOCKS_MAX = int(os.environ.get("ACHIEVEMENT_KNOWN_UNLOCKS_MAX", 100000))
+ACHIEVEMENT_UNLOCK_POINTS = 50
+
+# Each achievement unlocks once the named counter reaches the threshold
+ACHIEVEMENT_RULES = (
+    {"achievement_id": "first_job_apply", "counter": "applications", "threshold": 1},
+    {"achievement_id": "savings_milestone_25", "counter": "savings_percent", "threshold": 25},
+    {"achievement_id": "savings_milestone_50", "counter": "savings_percent", "threshold": 50},
+    {"achievement_id": "task_master", "counter": "tasks_completed", "threshold": 10},
+    {"achievement_id": "terminal_ninja", "counter": "commands_executed", "threshold": 50},
+    {"achievement_id": "pong_champion", "counter": "pong_high_score", "threshold": 200},
+    {"achievement_id": "easter_hunter", "counter": "easter_eggs_found", "threshold": 5},
+    {"achievement_id": "streak_week", "counter": "daily_streak", "threshold": 7}
+)
+
+def savings_progress(user: Dict) -> float:
+    """Percent of the savings goal reached, counting the streak bonus"""
+    savings_goal = user.get("savings_goal", 5000.0)
+    total_savings = user.get("current_savings", 0.0) + user.get("daily_streak", 1) * 25
+    return min((total_savings / savings_goal) * 100, 100)
+
+def user_achievement_gauges(user: Dict) -> Dict[str, float]:
+    """Counter values for rules that read the user document"""
+    return {
+        "savings_percent": savings_progress(user),
+        "daily_streak": user.get("daily_streak", 0),
+        "pong_high_score": user.get("pong_high_score", 0),
+        "commands_executed": user.get("commands_executed", 0),
+        "easter_eggs_found": user.get("easter_eggs_found", 0)
+    }
+
+class AchievementEngine:
+    """Evaluates achievement rules as counters change and unlocks in batches.
+
+    Rules are indexed by counter, so an observation only looks at the rules
+    for the counters it carries. Unlocks collect in memory and are written by
+    one bulk_write per flush, stamped with a batch id and awarded=False. The
+    batch is then read back to learn which ones actually changed state, and
+    points are awarded only for those; a batch stays unawarded until every
+    award step has succeeded, so later flushes retry it.
+    """
+
+    def __init__(self, rules, flush_interval: float, known_max: int):
+        self.rules_by_counter: Dict[str, List[Dict]] = {}
+        for rule in rules:
+            self.rules_by_counter.setdefault(rule["counter"], []).append(rule)
+        self.flush_interval = flush_interval
+        self.known_max = known_max
+        self.known: "OrderedDict[tuple, None]" = OrderedDict()
+        self.pending: set = set()
+        self.flush_lock = asyncio.Lock()
+        self.loop = PeriodicTask("Achievement flush", self.flush, flush_interval)
+        self.observed = 0
+        self.unlocked = 0
+
+    def start(self):
+        self.loop.start()
+
+    def observe(self, user_id: str, counters: Dict[str, Any]):
+        """Queue unlocks for rules whose counter has reached its threshold"""
+        self.observed += 1
+        for counter, value in counters.items():
+            if not isinstance(value, (int, float)):
+                continue
+            for rule in self.rules_by_counter.get(counter, ()):
+                key = (user_id, rule["achievement_id"])
+                if value >= rule["threshold"] and key not in self.known:
+                    self.pending.add(key)
+
+    def _remember(self, key: tuple):
+        self.known[key] = None
+        if len(self.known) > self.known_max:
+            self.known.popitem(last=False)
+
+    async def flush(self):
+        async with self.flush_lock:
+            if self.pending:
+                await self._unlock()
+            
+            # Award every batch not yet fully awarded, including ones an earlier flush failed on
+            batches = await db.achievements.distinct("unlock_batch", {"awarded": False})
+            for batch in batches:
+                await self._award(batch)
+
+    async def _unlock(self):
+        pending, self.pending = self.pending, set()
+        batch = str(uuid.uuid4())
+        now = datetime.now()
+        try:
+            await db.achievements.bulk_write([
+                UpdateOne(
+                    {"user_id": user_id, "id": achievement_id, "unlocked": False},
+                    {"$set": {"unlocked": True, "unlock_date": now, "unlock_batch": batch, "awarded": False}}
+                )
+                for user_id, achievement_id in pending
+            ], ordered=False)
+        except Exception:
+            self.pending |= pending
+            raise
+        for key in pending:
+            self._remember(key)
+
+    async def _award(self, batch: str):
+        """Apply a batch's counter increments and points, one recorded stage at a time.
         
+        award_stage on the batch's documents records the last completed step,
+        so a retry after a failure resumes instead of repeating increments.
+        """
+        unlocked = await db.achievements.find(
+            {"unlock_batch": batch, "awarded": False}, {"_id": 0, "user_id": 1, "id": 1, "award_stage": 1}
+        ).to_list(None)
+        if not unlocked:
+            return
+        stage = unlocked[0].get("award_stage", 0)
+        per_user: Dict[str, int] = {}
+        for achievement in unlocked:
+            per_user[achievement["user_id"]] = per_user.get(achievement["user_id"], 0) + 1
+        
+        if stage < 1:
+            await db.users.bulk_write([
+                UpdateOne({"id": user_id}, {"$inc": {"achievements_unlocked": count}})
+                for user_id, count in per_user.items()
+            ], ordered=False)
+            await db.achievements.update_many({"unlock_batch": batch}, {"$set": {"award_stage": 1}})
+        if stage < 2:
+            await db.user_counters.bulk_write([
+                UpdateOne({"user_id": user_id}, {"$inc": {"achievements_unlocked": count}}, upsert=True)
+                for user_id, count in per_user.items()
+            ], ordered=False)
+            await db.achievements.update_many({"unlock_batch": batch}, {"$set": {"award_stage": 2}})
+        
+        for achievement in unlocked:
+            user_cache.invalidate(achievement["user_id"])
+            await log_productivity_action(
+                achievement["user_id"], "achievement_unlocked", ACHIEVEMENT_UNLOCK_POINTS,
+                {"achievement_id": achievement["id"]}
+            )
+        await db.achievements.update_many({"unlock_batch": batch}, {"$set": {"awarded": True, "award_stage": 3}})
+        self.unlocked += len(unlocked)
+
+    async def close(self):
+        await self.loop.close()
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
         return {
-            "success": True,
-            "playlist": playlist,
-            "count": len(playlist),
-            "message": "Luxury curated playlist loaded"
+            "rules": sum(len(rules) for rules in self.rules_by_counter.values()),
+            "observed": self.observed,
+            "pending": len(self.pending),
+            "unlocked": self.unlocked,
+            "known_unlocks": len(self.known)
         }
+
+achievement_engine = AchievementEngine(ACHIEVEMENT_RULES, ACHIEVEMENT_FLUSH_INTERVAL_SECONDS, ACHIEVEMENT_KNOWN_UNLOCKS_MAX)
+
+# Job fetching service
+REMOTIVE_API_URL = os.environ.get("REMOTIVE_API_URL", "https://remotive.io/api/remote-jobs")
+REMOTIVE_TIMEOUT_SECONDS = float(os.environ.get("REMOTIVE_TIMEOUT_SECONDS", 30))
+REMOTIVE_JOB_LIMIT = 25
+REMOTIVE_FAILURE_THRESHOLD = int(os.environ.get("REMOTIVE_FAILURE_THRESHOLD", 3))
+REMOTIVE_BACKOFF_BASE_SECONDS = float(os.environ.get("REMOTIVE_BACKOFF_BASE_SECONDS", 30))
+REMOTIVE_BACKOFF_MAX_SECONDS = float(os.environ.get("REMOTIVE_BACKOFF_MAX_SECONDS", 1800))
+
+class CircuitBreaker:
+    """Opens after consecutive failures and stays open for an exponentially growing backoff.
+
+    Once the backoff elapses the breaker is half-open: the next call is let
+    through as a trial, and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, base_delay: float, max_delay: float):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = 0
+        self.opened_until = 0.0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        return "open" if time.monotonic() < self.opened_until else "half_open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_until = 0.0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            delay = min(self.base_delay * 2 ** (self.failures - self.failure_threshold), self.max_delay)
+            self.opened_until = time.monotonic() + delay
+            self.trips += 1
+
+class JobFetchingService:
+    def __init__(self, base_url: str = REMOTIVE_API_URL, timeout: float = REMOTIVE_TIMEOUT_SECONDS):
+        self.base_url = base_url
+        self.client = httpx.AsyncClient(timeout=timeout)
+        self.breaker = CircuitBreaker(
+            REMOTIVE_FAILURE_THRESHOLD, REMOTIVE_BACKOFF_BASE_SECONDS, REMOTIVE_BACKOFF_MAX_SECONDS
+        )
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.snapshot: List[Dict] = []
+        self.last_status = "never_fetched"
+    
+    async def fetch_remotive_jobs(self) -> List[Dict]:
+        """Fetch real jobs from Remotive API.
+        
+        Returns the last good snapshot when the feed is unchanged (304), the
+        request fails, or the circuit is open; `last_status` says which.
+        """
+        if not self.breaker.allow():
+            self.last_status = "circuit_open"
+            return self.snapshot
+        
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        
+        try:
+            async with self.client.stream("GET", self.base_url, headers=headers) as response:
+                if response.status_code == 304:
+                    self.breaker.record_success()
+                    self.last_status = "not_modified"
+                    return self.snapshot
+                
+                response.raise_for_status()
+                raw_jobs = await self._read_jobs(response, REMOTIVE_JOB_LIMIT)
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except Exception as e:
+            self.breaker.record_failure()
+            self.last_status = "error"
+            logger.error(f"Error fetching Remotive jobs (circuit {self.breaker.state}): {e}")
+            return self.snapshot
+        
+        self.breaker.record_success()
+        self.etag, self.last_modified = etag, last_modified
+        self.snapshot = [self._normalize_job(job) for job in raw_jobs]
+        self.last_status = "fresh"
+        return self.snapshot
+    
+    async def _read_jobs(self, response: httpx.Response, limit: int) -> List[Dict]:
+        """Parse the first `limit` jobs, streaming so the rest of the feed is never parsed"""
+        if ijson is None:
+            body = await response.aread()
+            data = await asyncio.to_thread(json.loads, body)
+            return data.get('jobs', [])[:limit]
+        
+        jobs = ijson.sendable_list()
+        parser = ijson.items_coro(jobs, 'jobs.item', use_float=True)
+        collected: List[Dict] = []
+        async for chunk in response.aiter_bytes():
+            parser.send(chunk)
+            collected.extend(jobs)
+            del jobs[:]
+            if len(collected) >= limit:
+                # Closing the stream early skips downloading the remainder
+                return collected[:limit]
+        parser.close()
+        collected.extend(jobs)
+        return collected[:limit]
+    
+    def _normalize_job(self, job: Dict) -> Dict:
+        source_id = str(job['id'] if job.get('id') is not None else job.get('url') or uuid.uuid4())
+        return {
+            "id": f"remotive_{source_id}",
+            "source_id": source_id,
+            "title": job.get('title', ''),
+            "company": job.get('company_name', ''),
+            "location": job.get('candidate_required_location', 'Remote'),
+            "salary": self._format_salary(job.get('salary')),
+            "type": job.get('job_type', 'Full-time'),
+            "description": job.get('description', '')[:500] + "..." if job.get('description') else '',
+            "skills": job.get('tags', [])[:5],
+            "posted_date": job.get('publication_date', datetime.now()),
+            "application_status": "not_applied",
+            "source": "Remotive",
+            "url": job.get('url', '')
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_status": self.last_status,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "circuit_trips": self.breaker.trips,
+            "snapshot_size": len(self.snapshot)
+        }
+    
+    def _format_salary(self, salary_text) -> str:
+        """Format salary text"""
+        if not salary_text:
+            return "Competitive"
+        return str(salary_text)[:50]  # Limit length
+    
+    async def refresh_jobs(self):
+        """Fetch fresh jobs and swap them in with a single bulk write"""
+        jobs = await self.fetch_remotive_jobs()
+        
+        # Unchanged or fallback snapshots are already stored
+        if jobs and self.last_status == "fresh":
+            # Upsert the new snapshot first, then drop anything it didn't
+            # contain, so concurrent readers never see an empty collection
+            refresh_batch = str(uuid.uuid4())
+            staged = {job["source_id"]: {**job, "refresh_batch": refresh_batch} for job in jobs}
+            operations = [
+                ReplaceOne({"source": "Remotive", "source_id": source_id}, job, upsert=True)
+                for source_id, job in staged.items()
+            ]
+            operations.append(DeleteMany({"source": "Remotive", "refresh_batch": {"$ne": refresh_batch}}))
+            
+            result = await db.jobs.bulk_write(operations, ordered=True)
+            
+            logger.info(
+                f"Refreshed {len(staged)} jobs from Remotive "
+                f"({result.upserted_count} new, {result.deleted_count} stale removed)"
+            )
+        
+        return len(jobs)
+    
+    async def close(self):
+        await self.client.aclose()
+
+job_service = JobFetchingService()
+
+# Background job refresh
+JOB_REFRESH_INTERVAL_SECONDS = float(os.environ.get("JOB_REFRESH_INTERVAL_SECONDS", 900))
+JOB_REFRESH_JITTER = float(os.environ.get("JOB_REFRESH_JITTER", 0.1))
+JOB_CACHE_STALE_SECONDS = float(os.environ.get("JOB_CACHE_STALE_SECONDS", JOB_REFRESH_INTERVAL_SECONDS * 2))
+JOB_SERVE_STALE = os.environ.get("JOB_SERVE_STALE", "true").lower() == "true"
+JOB_MIN_SNAPSHOT_SIZE = 10
+JOB_LIST_LIMIT = 50
+
+class JobRefreshScheduler:
+    """Keeps a warm in-process snapshot of job listings.
+
+    A background loop refreshes from Remotive every interval (with jitter
+    so workers don't fetch in lockstep) and reloads the snapshot. At most
+    one refresh runs at a time; callers asking for one while it is in
+    flight share the same task. Requests only ever read the snapshot.
+    """
+
+    def __init__(self, service: JobFetchingService, interval: float, jitter: float,
+                 stale_after: float, serve_stale: bool):
+        self.service = service
+        self.interval = interval
+        self.jitter = jitter
+        self.stale_after = stale_after
+        self.serve_stale = serve_stale
+        self.jobs: List[Dict] = []
+        self.loaded_at: Optional[float] = None
+        self.refresh_task: Optional[asyncio.Task] = None
+        self.loop = PeriodicTask("Job refresh", self._tick, run_first=True, wait=self._wait)
+
+    def start(self):
+        self.loop.start()
+
+    async def _wait(self):
+        await asyncio.sleep(self.interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def _tick(self):
+        # The first tick warms the snapshot and only refreshes if it is too small
+        if self.loaded_at is None:
+            await self.load()
+            if len(self.jobs) >= JOB_MIN_SNAPSHOT_SIZE:
+                return
+        await self.trigger_refresh()
+
+    def trigger_refresh(self) -> asyncio.Task:
+        """Start a refresh unless one is already running, and return it"""
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._refresh())
+        return self.refresh_task
+
+    async def _refresh(self):
+        try:
+            await self.service.refresh_jobs()
+        except Exception as e:
+            logger.error(f"Job refresh failed: {e}")
+        await self.load()
+
+    async def load(self):
+        """Reload the snapshot from the jobs collection"""
+        try:
+            self.jobs = await db.jobs.find({}, {"_id": 0}).sort("posted_date", -1).limit(JOB_LIST_LIMIT).to_list(JOB_LIST_LIMIT)
+            self.loaded_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Job snapshot load failed: {e}")
+
+    def age(self) -> Optional[float]:
+        return time.monotonic() - self.loaded_at if self.loaded_at is not None else None
+
+    async def get_jobs(self) -> List[Dict]:
+        """Return the current snapshot, revalidating it if stale"""
+        if self.loaded_at is None:
+            # Cold worker: a single indexed read, never an upstream fetch
+            await self.load()
+        elif self.age() > self.stale_after:
+            refresh = self.trigger_refresh()
+            if not self.serve_stale:
+                await refresh
+        return self.jobs
+
+    async def close(self):
+        await self.loop.close()
+        if self.refresh_task and not self.refresh_task.done():
+            self.refresh_task.cancel()
+            try:
+                await self.refresh_task
+            except asyncio.CancelledError:
+                pass
+
+job_scheduler = JobRefreshScheduler(
+    job_service, JOB_REFRESH_INTERVAL_SECONDS, JOB_REFRESH_JITTER, JOB_CACHE_STALE_SECONDS, JOB_SERVE_STALE
+)
+
+# Index provisioning
+INDEX_DRIFT_ACTION = os.environ.get("INDEX_DRIFT_ACTION", "warn")  # warn or fix
+INDEX_PLAN_CHECK = os.environ.get("INDEX_PLAN_CHECK", "warn")  # warn, fail or off
+
+def _user_scoped_indexes(sort_field: str) -> List[IndexModel]:
+    # The listing index matches the (sort_field, id) keyset used for pagination
+    return [
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), (sort_field, DESCENDING), ("id", DESCENDING)])
+    ]
+
+# Every index the API relies on, keyed by collection
+INDEX_PLAN: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)]),
+        # Registered usernames are unique; demo users' generated names are not
+        IndexModel(
+            [("username", ASCENDING), ("registered", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"registered": True}
+        ),
+        IndexModel([("last_streak_date", ASCENDING)])
+    ],
+    "sessions": [
+        IndexModel([("token", ASCENDING)], unique=True),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    ],
+    "achievements": [
+        IndexModel([("unlock_batch", ASCENDING)], sparse=True),
+        IndexModel([("awarded", ASCENDING)], partialFilterExpression={"awarded": False}),
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("unlocked", DESCENDING)])
+    ],
+    "downloads": _user_scoped_indexes("created_date"),
+    "documents": _user_scoped_indexes("modified_date") + [
+        IndexModel([("user_id", ASCENDING), ("search_terms", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("tags", ASCENDING)]),
+        IndexModel(
+            [("user_id", ASCENDING), ("title", TEXT), ("content", TEXT), ("tags", TEXT)],
+            weights={"title": 10, "tags": 5, "content": 1},
+            name="documents_text"
+        )
+    ],
+    "files": _user_scoped_indexes("upload_date") + [
+        IndexModel([("sha256", ASCENDING)])
+    ],
+    "blob_refs": [
+        IndexModel([("sha256", ASCENDING)], unique=True)
+    ],
+    "tasks": _user_scoped_indexes("created_date") + [
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)])
+    ],
+    "jobs": [
+        IndexModel([("posted_date", DESCENDING)]),
+        IndexModel(
+            [("source", ASCENDING), ("source_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"source_id": {"$exists": True}}
+        ),
+        IndexModel([("source", ASCENDING), ("refresh_batch", ASCENDING)])
+    ],
+    "productivity_logs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("timestamp", ASCENDING)])
+    ],
+    "productivity_rollups": [
+        IndexModel([("user_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)], unique=True),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    ],
+    "weather_cache": [
+        IndexModel([("location", ASCENDING), ("kind", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    ],
+    "applications": [IndexModel([("user_id", ASCENDING)])],
+    "document_revisions": [IndexModel([("document_id", ASCENDING), ("revision", ASCENDING)], unique=True)],
+    "user_counters": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        IndexModel([("rebuilt_at", ASCENDING)])
+    ],
+    "relocate_applications": [IndexModel([("user_id", ASCENDING)])]
+}
+
+# Queries on request paths that must never fall back to a collection scan
+HOT_QUERIES = [
+    ("users", {"id": ""}, None),
+    ("sessions", {"token": ""}, None),
+    ("downloads", {"id": "", "user_id": ""}, None),
+    ("downloads", {"user_id": ""}, {"created_date": -1, "id": -1}),
+    ("documents", {"id": "", "user_id": ""}, None),
+    ("documents", {"user_id": ""}, {"modified_date": -1, "id": -1}),
+    ("files", {"id": "", "user_id": ""}, None),
+    ("files", {"user_id": ""}, {"upload_date": -1, "id": -1}),
+    ("tasks", {"id": "", "user_id": ""}, None),
+    ("tasks", {"user_id": ""}, {"created_date": -1, "id": -1}),
+    ("tasks", {"user_id": "", "status": "completed"}, None),
+    ("achievements", {"user_id": ""}, None),
+    ("jobs", {}, {"posted_date": -1}),
+    ("weather_cache", {"location": "", "kind": "current"}, None),
+    ("user_counters", {"user_id": ""}, None),
+    ("productivity_rollups", {"user_id": "", "granularity": "hour"}, {"bucket": 1})
+]
+
+_INDEX_OPTIONS = ("unique", "expireAfterSeconds", "sparse", "partialFilterExpression")
+
+def _index_options(index: Dict[str, Any]) -> Dict[str, Any]:
+    return {option: index[option] for option in _INDEX_OPTIONS if option in index}
+
+async def reconcile_collection_indexes(collection_name: str, models: List[IndexModel]):
+    """Create missing indexes and report drift against the declared plan"""
+    collection = db[collection_name]
+    existing = await collection.index_information()
+    by_key = {tuple(info["key"]): (name, info) for name, info in existing.items()}
+    managed = {"_id_"}
+    
+    for model in models:
+        declared = model.document
+        key = tuple(declared["key"].items())
+        match = by_key.get(key)
+        if match is None and declared["name"] in existing:
+            # Text indexes report their key as _fts/_ftsx, so fall back to the name
+            match = (declared["name"], existing[declared["name"]])
+        
+        if match is None:
+            try:
+                await collection.create_indexes([model])
+                logger.info(f"Index plan: created {collection_name}.{declared['name']}")
+                managed.add(declared["name"])
+            except Exception as e:
+                logger.error(f"Index plan: could not create {collection_name}.{declared['name']}: {e}")
+            continue
+        
+        name, info = match
+        managed.add(name)
+        if _index_options(info) == _index_options(declared):
+            continue
+        
+        logger.warning(
+            f"Index drift on {collection_name}.{name}: "
+            f"have {_index_options(info)}, want {_index_options(declared)}"
+        )
+        if INDEX_DRIFT_ACTION == "fix":
+            try:
+                await collection.drop_index(name)
+                await collection.create_indexes([model])
+                logger.info(f"Index plan: rebuilt {collection_name}.{name}")
+            except Exception as e:
+                logger.error(f"Index plan: could not rebuild {collection_name}.{name}: {e}")
+    
+    unmanaged = sorted(set(existing) - managed)
+    if unmanaged:
+        logger.info(f"Index plan: unmanaged indexes on {collection_name}: {', '.join(unmanaged)}")
+
+def _plan_stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            yield from _plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+async def check_hot_query_plans() -> List[str]:
+    """Explain every hot query and return the ones still planned as collection scans"""
+    scans = []
+    for collection_name, query, sort in HOT_QUERIES:
+        find = {"find": collection_name, "filter": query}
+        if sort:
+            find["sort"] = sort
+        explained = await db.command({"explain": find, "verbosity": "queryPlanner"})
+        if "COLLSCAN" in _plan_stages(explained["queryPlanner"]["winningPlan"]):
+            scans.append(f"{collection_name} {query} sort={sort}")
+    return scans
+
+async def provision_indexes():
+    """Reconcile INDEX_PLAN at startup and verify hot queries use an index"""
+    for collection_name, models in INDEX_PLAN.items():
+        try:
+            await reconcile_collection_indexes(collection_name, models)
+        except Exception as e:
+            logger.error(f"Index plan: could not reconcile {collection_name}: {e}")
+    
+    if INDEX_PLAN_CHECK == "off":
+        return
+    
+    try:
+        scans = await check_hot_query_plans()
+    except Exception as e:
+        logger.warning(f"Index plan: could not explain hot queries: {e}")
+        return
+    
+    for scan in scans:
+        logger.warning(f"Index plan: hot query would scan the collection: {scan}")
+    if scans and INDEX_PLAN_CHECK == "fail":
+        raise RuntimeError(f"{len(scans)} hot queries would scan their collection")
+
+# Static catalog responses
+STATIC_CONTENT_PATH = Path(os.environ.get("STATIC_CONTENT_PATH", ROOT_DIR / "static_content.json"))
+STATIC_CONTENT_MAX_AGE_SECONDS = float(os.environ.get("STATIC_CONTENT_MAX_AGE_SECONDS", 300))
+STATIC_CONTENT_CHECK_SECONDS = 1.0
+
+def _build_root(data: Dict, now: datetime) -> Dict:
+    return {**data, "timestamp": now.isoformat()}
+
+def _build_music_playlist(data: List, now: datetime) -> Dict:
+    return {"success": True, "playlist": data, "count": len(data), "message": "Luxury curated playlist loaded"}
+
+def _build_music_trending(data: List, now: datetime) -> Dict:
+    return {"success": True, "trending": data, "count": len(data)}
+
+def _build_virtual_pets(data: Dict, now: datetime) -> Dict:
+    return {**data, "total_pets": len(data["pets"])}
+
+def _build_ai_tools(data: Dict, now: datetime) -> Dict:
+    return data
+
+def _build_relocate_opportunities(data: Dict, now: datetime) -> Dict:
+    opportunities = [{**opportunity, "posted_date": now.isoformat()} for opportunity in data["opportunities"]]
+    return {
+        "success": True,
+        "opportunities": opportunities,
+        "total_opportunities": len(opportunities),
+        "featured_countries": data["featured_countries"],
+        "success_stories": data["success_stories"],
+        "active_relocations": data["active_relocations"]
+    }
+
+def _build_news_live(data: List, now: datetime) -> Dict:
+    news_items = []
+    for item in data:
+        item = dict(item)
+        item["published_at"] = (now - timedelta(hours=item.pop("hours_ago", 0))).isoformat()
+        news_items.append(item)
+    return {"success": True, "news": news_items, "total": len(news_items), "last_updated": now.isoformat()}
+
+# Each catalog in the data file and the function shaping it into a response
+STATIC_CATALOG_BUILDERS = {
+    "root": _build_root,
+    "music_playlist": _build_music_playlist,
+    "music_trending": _build_music_trending,
+    "virtual_pets": _build_virtual_pets,
+    "ai_tools": _build_ai_tools,
+    "relocate_opportunities": _build_relocate_opportunities,
+    "news_live": _build_news_live
+}
+
+class StaticContentEntry:
+    """One catalog pre-encoded as identity, gzip and brotli bodies"""
+
+    __slots__ = ("etag", "identity", "gzip", "brotli", "built_at")
+
+    def __init__(self, payload: Any):
+        body = dumps_json(payload)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.identity = body
+        self.gzip = gzip.compress(body, compresslevel=9, mtime=0)
+        self.brotli = brotli.compress(body) if brotli is not None else None
+        self.built_at = time.monotonic()
+
+    def etags(self) -> set:
+        # Each encoding is a different representation, so each gets its own strong ETag
+        return {self.etag, self.etag[:-1] + '-gzip"', self.etag[:-1] + '-br"'}
+
+class StaticContentRegistry:
+    """Serves constant catalogs from pre-encoded bytes with strong ETags.
+
+    The data file is re-read when its mtime changes (checked at most once
+    a second), and entries are rebuilt after `max_age` so their embedded
+    timestamps stay fresh. Between rebuilds a request costs a dict lookup.
+    """
+
+    def __init__(self, path: Path, builders: Dict[str, Any], max_age: float):
+        self.path = path
+        self.builders = builders
+        self.max_age = max_age
+        self.data: Dict[str, Any] = {}
+        self.entries: Dict[str, StaticContentEntry] = {}
+        self.mtime_ns: Optional[int] = None
+        self.checked_at = 0.0
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if now - self.checked_at < STATIC_CONTENT_CHECK_SECONDS and self.mtime_ns is not None:
+            return
+        self.checked_at = now
+        
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except OSError as e:
+            if self.mtime_ns is None:
+                raise
+            logger.warning(f"Static content file unavailable, keeping previous catalogs: {e}")
+            return
+        if mtime_ns == self.mtime_ns:
+            return
+        
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError) as e:
+            if self.mtime_ns is None:
+                raise
+            # Keep serving the last good catalogs and wait for the file to change again
+            logger.error(f"Could not reload static content from {self.path}, keeping previous catalogs: {e}")
+            self.mtime_ns = mtime_ns
+            return
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.entries.clear()
+        logger.info(f"Loaded static content catalogs from {self.path}")
+
+    def get(self, name: str) -> StaticContentEntry:
+        self._reload_if_changed()
+        entry = self.entries.get(name)
+        if entry is None or time.monotonic() - entry.built_at > self.max_age:
+            telemetry.record_cache("static", False)
+            entry = self.entries[name] = StaticContentEntry(self.builders[name](self.data[name], datetime.now()))
+        else:
+            telemetry.record_cache("static", True)
+        return entry
+
+    def respond(self, name: str, request: Request) -> Response:
+        """Answer with 304, or the best pre-encoded body the client accepts"""
+        entry = self.get(name)
+        headers = {"Cache-Control": "public, max-age=60", "Vary": "Accept-Encoding"}
+        
+        accept_encoding = request.headers.get("accept-encoding", "")
+        if entry.brotli is not None and "br" in accept_encoding:
+            body, headers["Content-Encoding"], headers["ETag"] = entry.brotli, "br", entry.etag[:-1] + '-br"'
+        elif "gzip" in accept_encoding:
+            body, headers["Content-Encoding"], headers["ETag"] = entry.gzip, "gzip", entry.etag[:-1] + '-gzip"'
+        else:
+            body, headers["ETag"] = entry.identity, entry.etag
+        
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip() for tag in if_none_match.split(",")}
+            matched = tags & entry.etags()
+            if "*" in tags or matched:
+                # Echo the tag the client holds, preferring the negotiated variant
+                if matched and headers["ETag"] not in matched:
+                    headers["ETag"] = sorted(matched)[0]
+                headers.pop("Content-Encoding", None)
+                return Response(status_code=304, headers=headers)
+        
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def warm(self):
+        """Encode every catalog up front"""
+        for name in self.builders:
+            self.get(name)
+
+static_content = StaticContentRegistry(STATIC_CONTENT_PATH, STATIC_CATALOG_BUILDERS, STATIC_CONTENT_MAX_AGE_SECONDS)
+
+# API Routes
+@app.get("/api/")
+async def read_root(request: Request):
+    return static_content.respond("root", request)
+
+# Music API Endpoints (Fallback System - No YouTube API Required)
+@app.get("/api/music/playlist")
+async def get_music_playlist(request: Request):
+    """Get the curated luxury music playlist"""
+    try:
+        return static_content.respond("music_playlist", request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching playlist: {str(e)}")
 
 @app.get("/api/music/trending")
-async def get_trending_music():
+async def get_trending_music(request: Request):
     """Get trending luxury music"""
     try:
-        trending = [
-            {
-                "id": "trend_001",
-                "title": "Obsidian Dreams",
-                "artist": "Luxury Collective",
-                "album": "Trending Now",
-                "duration": "4:15",
-                "cover": "https://images.unsplash.com/photo-1470225620780-dba8ba36b745?w=300&h=300&fit=crop",
-                "source": "Trending",
-                "plays": "1.2M"
-            },
-            {
-                "id": "trend_002",
-                "title": "Gold Rush",
-                "artist": "Noir Artists",
-                "album": "Popular",
-                "duration": "3:42",
-                "cover": "https://images.unsplash.com/photo-1493225457124-a3eb161ffa5f?w=300&h=300&fit=crop",
-                "source": "Trending",
-                "plays": "890K"
-            }
-        ]
-        
-        return {
-            "success": True,
-            "trending": trending,
-            "count": len(trending)
-        }
+        return static_content.respond("music_trending", request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching trending music: {str(e)}")
 
@@ -711,51 +2279,625 @@ async def get_music_recommendations(track_id: str):
 
 # Virtual Pets and Job Portal Integration
 @app.get("/api/virtual-pets")
-async def get_virtual_pets_info():
+async def get_virtual_pets_info(request: Request):
     """Get information about all virtual pets tools"""
-    return {
-        "message": "Virtual Pets Ecosystem Available",
-        "pets": {
-            "cosmic_pets": {
-                "description": "A cosmic-themed browser-based virtual pet hatching and caring game",
-                "features": [
-                    "Hatch cosmic eggs",
-                    "Feed and care for pets", 
-                    "Level up and evolve",
-                    "Achievement system",
-                    "Real-time pet stats"
-                ],
-                "url": "/virtual-pets-tool/",
-                "technology": "Pure HTML/CSS/JavaScript"
-            },
-            "desktop_pets": {
-                "description": "Advanced desktop pets with AI behavior",
-                "features": [
-                    "Multiple pet types (cats, dogs, rabbits, etc.)",
-                    "AI-driven autonomous behavior",
-                    "Draggable pet interaction",
-                    "Dynamic state management",
-                    "Food spawning and consumption",
-                    "Speech bubbles and personality"
-                ],
-                "url": "/virtual-desktop-pets/",
-                "technology": "Advanced JavaScript with AI behavior"
-            }
-        },
-        "total_pets": 2
-    }
+    return static_content.respond("virtual_pets", request)
+
+# Live event push
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", 64))
+EVENT_HEARTBEAT_SECONDS = float(os.environ.get("EVENT_HEARTBEAT_SECONDS", 15))
+EVENT_RETRY_MS = 3000
+
+def encode_event(event_type: str, data: Any) -> bytes:
+    return b"event: " + event_type.encode() + b"\ndata: " + dumps_json(data) + b"\n\n"
+
+class EventSubscriber:
+    def __init__(self, topic: str, queue_size: int):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+
+class EventHub:
+    """In-process pub/sub that fans events out to server-sent event streams.
+
+    Each event is encoded once and pushed onto every subscriber's bounded
+    queue without waiting. A subscriber whose queue is full is dropped:
+    its stream ends and the browser's EventSource reconnects and resyncs,
+    so one slow client never holds up the producer or grows memory.
+    """
+
+    def __init__(self, queue_size: int, heartbeat: float):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.topics: Dict[str, set] = {}
+        self.retained: Dict[str, bytes] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self.topics.get(topic, ()))
+
+    def subscribe(self, topic: str) -> EventSubscriber:
+        subscriber = EventSubscriber(topic, self.queue_size)
+        self.topics.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: EventSubscriber):
+        subscribers = self.topics.get(subscriber.topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.topics[subscriber.topic]
+
+    def publish(self, topic: str, event_type: str, data: Any, retain: bool = False):
+        """Queue an event for every subscriber; `retain` replays it to new ones"""
+        subscribers = self.topics.get(topic)
+        if not subscribers and not retain:
+            return
+        message = encode_event(event_type, data)
+        self.published += 1
+        if retain:
+            self.retained[topic] = message
+        
+        for subscriber in list(subscribers or ()):
+            try:
+                subscriber.queue.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: EventSubscriber):
+        self.dropped += 1
+        self.unsubscribe(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    async def stream(self, topic: str, request: Request):
+        """Server-sent event body for one client"""
+        subscriber = self.subscribe(topic)
+        try:
+            yield f"retry: {EVENT_RETRY_MS}\n\n".encode()
+            if topic in self.retained:
+                yield self.retained[topic]
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield b": keepalive\n\n"
+                    continue
+                if message is None:
+                    yield encode_event("dropped", {"reason": "slow consumer"})
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    def response(self, topic: str, request: Request) -> StreamingResponse:
+        return StreamingResponse(
+            self.stream(topic, request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": sum(len(subscribers) for subscribers in self.topics.values()),
+            "topics": len(self.topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped
+        }
+
+event_hub = EventHub(EVENT_QUEUE_SIZE, EVENT_HEARTBEAT_SECONDS)
+
+def publish_download_event(user_id: str, download_id: str, **fields):
+    event_hub.publish(f"downloads:{user_id}", "progress", {"id": download_id, **fields})
+
+# Download progress coalescing
+DOWNLOAD_PROGRESS_FLUSH_SECONDS = float(os.environ.get("DOWNLOAD_PROGRESS_FLUSH_SECONDS", 5))
+DOWNLOAD_PROGRESS_IDLE_SECONDS = float(os.environ.get("DOWNLOAD_PROGRESS_IDLE_SECONDS", 300))
+DOWNLOAD_TERMINAL_STATUSES = ["completed", "failed", "cancelled"]
+
+class DownloadProgressTable:
+    """Holds the latest reported progress per download in memory.
+
+    Progress reports only overwrite the in-memory entry; dirty entries are
+    written with one bulk_write every `flush_interval` seconds. A status
+    change is written straight away. Completion is a single conditional
+    update on the status, so the bonus is awarded once however many
+    duplicate completion reports arrive.
+    """
+
+    def __init__(self, flush_interval: float, idle_after: float):
+        self.flush_interval = flush_interval
+        self.idle_after = idle_after
+        self.entries: Dict[str, Dict] = {}
+        self.dirty: set = set()
+        self.flush_lock = asyncio.Lock()
+        self.loop = PeriodicTask("Download progress flush", self.flush, flush_interval)
+        self.reports = 0
+        self.writes = 0
+        self.completions = 0
+
+    def start(self):
+        self.loop.start()
+
+    def get(self, download_id: str, user_id: str) -> Optional[Dict]:
+        entry = self.entries.get(download_id)
+        if entry and entry["user_id"] == user_id:
+            return {"progress": entry["progress"], "status": entry["status"]}
+        return None
+
+    async def report(self, download_id: str, user_id: str, progress: float, status: str):
+        """Record an in-progress report; completion only comes from complete()"""
+        self.reports += 1
+        entry = self.entries.get(download_id)
+        if entry and entry["status"] in DOWNLOAD_TERMINAL_STATUSES:
+            return
+        self.entries[download_id] = {"user_id": user_id, "progress": progress, "status": status, "updated": time.monotonic()}
+        publish_download_event(user_id, download_id, progress=progress, status=status)
+        
+        if entry is None or entry["status"] != status:
+            self.dirty.discard(download_id)
+            try:
+                await self._write([download_id])
+            except Exception as e:
+                logger.error(f"Download progress write failed, retrying on next flush: {e}")
+        else:
+            self.dirty.add(download_id)
+
+    async def complete(self, download_id: str, user_id: str, fields: Optional[Dict] = None) -> bool:
+        """Mark a download completed, awarding the bonus on the first transition only"""
+        entry = self.entries.get(download_id)
+        if entry and entry["user_id"] == user_id and entry["status"] == "completed":
+            return False
+        
+        self.writes += 1
+        result = await db.downloads.update_one(
+            {"id": download_id, "user_id": user_id, "status": {"$nin": ["completed", "cancelled"]}},
+            {"$set": {"progress": 100.0, "status": "completed", "completed_date": datetime.now(), **(fields or {})}}
+        )
+        if not result.modified_count:
+            return False
+        # Only cached once stored, so a failed or foreign completion cannot block the real one
+        self.entries[download_id] = {"user_id": user_id, "progress": 100.0, "status": "completed", "updated": time.monotonic()}
+        self.dirty.discard(download_id)
+        self.completions += 1
+        publish_download_event(user_id, download_id, progress=100.0, status="completed", **(fields or {}))
+        await log_productivity_action(user_id, "download_completed", 10, {"download_id": download_id})
+        return True
+
+    def discard(self, download_id: str):
+        self.entries.pop(download_id, None)
+        self.dirty.discard(download_id)
+
+    async def flush(self):
+        async with self.flush_lock:
+            dirty, self.dirty = self.dirty, set()
+            await self._write(dirty)
+            
+            idle_before = time.monotonic() - self.idle_after
+            for download_id in [k for k, v in self.entries.items() if v["updated"] < idle_before and k not in self.dirty]:
+                del self.entries[download_id]
+
+    async def _write(self, download_ids):
+        operations = [
+            UpdateOne(
+                {"id": download_id, "user_id": entry["user_id"], "status": {"$nin": DOWNLOAD_TERMINAL_STATUSES}},
+                {"$set": {"progress": entry["progress"], "status": entry["status"]}}
+            )
+            for download_id in download_ids
+            if (entry := self.entries.get(download_id))
+        ]
+        if not operations:
+            return
+        try:
+            await db.downloads.bulk_write(operations, ordered=False)
+            self.writes += 1
+        except Exception:
+            self.dirty.update(download_ids)
+            raise
+
+    async def close(self):
+        await self.loop.close()
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked": len(self.entries),
+            "dirty": len(self.dirty),
+            "reports": self.reports,
+            "writes": self.writes,
+            "completions": self.completions
+        }
+
+download_progress = DownloadProgressTable(DOWNLOAD_PROGRESS_FLUSH_SECONDS, DOWNLOAD_PROGRESS_IDLE_SECONDS)
+
+# Server-side download engine
+DOWNLOAD_DIR = Path(os.environ.get("DOWNLOAD_DIR", ROOT_DIR / "downloads"))
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 4))
+DOWNLOAD_PER_HOST_LIMIT = int(os.environ.get("DOWNLOAD_PER_HOST_LIMIT", 2))
+DOWNLOAD_MAX_BYTES = int(os.environ.get("DOWNLOAD_MAX_BYTES", 2 * 1024 ** 3))
+DOWNLOAD_MAX_RETRIES = int(os.environ.get("DOWNLOAD_MAX_RETRIES", 5))
+DOWNLOAD_RETRY_BASE_SECONDS = float(os.environ.get("DOWNLOAD_RETRY_BASE_SECONDS", 1))
+DOWNLOAD_RETRY_MAX_SECONDS = float(os.environ.get("DOWNLOAD_RETRY_MAX_SECONDS", 60))
+DOWNLOAD_PROGRESS_INTERVAL_SECONDS = float(os.environ.get("DOWNLOAD_PROGRESS_INTERVAL_SECONDS", 1))
+DOWNLOAD_TIMEOUT_SECONDS = float(os.environ.get("DOWNLOAD_TIMEOUT_SECONDS", 30))
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+DOWNLOAD_USER_QUOTA_BYTES = int(os.environ.get("DOWNLOAD_USER_QUOTA_BYTES", 5 * 1024 ** 3))
+DOWNLOAD_MAX_REDIRECTS = int(os.environ.get("DOWNLOAD_MAX_REDIRECTS", 5))
+DOWNLOAD_ALLOWED_SCHEMES = ("http", "https")
+DOWNLOAD_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+DOWNLOAD_ACTIVE_STATUSES = ["pending", "downloading"]
+
+class DownloadFailed(Exception):
+    """A download error that retrying will not fix"""
+
+class DownloadCancelled(Exception):
+    """The download record left the active states while it was running"""
+
+def parse_download_url(url: str) -> tuple:
+    """Validate a download URL's scheme and return its (host, port)"""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in DOWNLOAD_ALLOWED_SCHEMES:
+        raise DownloadFailed("Only http and https URLs can be downloaded")
+    if not parts.hostname:
+        raise DownloadFailed("URL has no host")
+    try:
+        return parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise DownloadFailed("URL has an invalid port")
+
+async def resolve_public_addresses(host: str, port: int) -> List[str]:
+    """Resolve a host, refusing it unless every address is on the public internet.
+
+    Loopback, private, link-local (cloud metadata) and reserved ranges are
+    all rejected.
+    """
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        # Resolver failures are usually transient; let the worker retry them
+        raise httpx.ConnectError(f"Cannot resolve {host}: {e}")
+    resolved = []
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if getattr(address, "ipv4_mapped", None):
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise DownloadFailed(f"Downloads from {host} are not allowed")
+        resolved.append(str(address))
+    return resolved
+
+async def check_download_url(url: str):
+    """Refuse URLs that do not point at the public internet"""
+    await resolve_public_addresses(*parse_download_url(url))
+
+class PublicAddressBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that dials only addresses resolve_public_addresses vetted.
+
+    Checking and connecting use the same resolution, so a DNS answer that
+    changes in between cannot redirect the connection. TLS still verifies
+    and sends SNI for the original host name.
+    """
+
+    def __init__(self):
+        self.backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None, local_address: Optional[str] = None, socket_options=None):
+        addresses = await resolve_public_addresses(host, port)
+        return await self.backend.connect_tcp(
+            addresses[0], port, timeout=timeout, local_address=local_address, socket_options=socket_options
+        )
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        raise httpcore.ConnectError("Unix sockets are not allowed for downloads")
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+class PublicAddressTransport(httpx.AsyncHTTPTransport):
+    """httpx transport whose connections go through PublicAddressBackend"""
+
+    def __init__(self, limits: httpx.Limits):
+        super().__init__(limits=limits)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=PublicAddressBackend()
+        )
+
+async def get_user_download_usage(user_id: str, exclude: Optional[str] = None) -> int:
+    """Bytes held by a user's running and completed downloads"""
+    totals = await db.downloads.aggregate([
+        {"$match": {"user_id": user_id, "id": {"$ne": exclude}, "status": {"$in": DOWNLOAD_ACTIVE_STATUSES + ["completed"]}}},
+        {"$group": {"_id": None, "used": {"$sum": "$size"}}}
+    ]).to_list(1)
+    return totals[0]["used"] if totals else 0
+
+class DownloadEngine:
+    """Fetches queued downloads to disk with a fixed pool of workers.
+
+    Workers share one httpx connection pool and a semaphore per host. Bytes
+    stream into a .part file that is resumed with a Range request after a
+    transient failure; progress is persisted at most once per interval.
+    Connections go through PublicAddressTransport, so every request and
+    redirect hop can only reach public addresses.
+    """
+
+    def __init__(self, directory: Path, workers: int, per_host_limit: int, transport=None):
+        self.directory = directory
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.active: Dict[str, asyncio.Task] = {}
+        self.queued: set = set()
+        self.cancelled: set = set()
+        self.worker_tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.bytes_downloaded = 0
+
+    async def start(self):
+        if self.worker_tasks:
+            return
+        self.client = httpx.AsyncClient(
+            timeout=DOWNLOAD_TIMEOUT_SECONDS,
+            follow_redirects=False,
+            transport=self.transport or PublicAddressTransport(
+                httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+            )
+        )
+        self.worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        
+        # Pick up downloads left unfinished by a previous process
+        try:
+            async for download in db.downloads.find(
+                {"status": {"$in": DOWNLOAD_ACTIVE_STATUSES}}, {"_id": 0, "id": 1, "user_id": 1, "url": 1, "filename": 1}
+            ):
+                self.submit(download)
+        except Exception as e:
+            logger.error(f"Could not requeue pending downloads: {e}")
+
+    def submit(self, download: Dict):
+        self.cancelled.discard(download["id"])
+        self.queued.add(download["id"])
+        self.queue.put_nowait(download)
+
+    def owns(self, download_id: str) -> bool:
+        return download_id in self.active or download_id in self.queued
+
+    def cancel(self, download_id: str):
+        """Stop a queued or running download; its partial file is discarded"""
+        task = self.active.get(download_id)
+        if task and not task.done():
+            self.cancelled.add(download_id)
+            task.cancel()
+        elif download_id in self.queued:
+            self.cancelled.add(download_id)
+
+    def part_path(self, download: Dict) -> Path:
+        return self.directory / download["user_id"] / f"{download['id']}.part"
+
+    def final_path(self, download: Dict) -> Path:
+        return self.directory / download["user_id"] / f"{download['id']}_{Path(download['filename']).name}"
+
+    async def remove(self, download_path: str):
+        """Delete a finished download's file"""
+        await asyncio.to_thread((self.directory / download_path).unlink, missing_ok=True)
+
+    async def _worker(self):
+        while True:
+            download = await self.queue.get()
+            self.queued.discard(download["id"])
+            try:
+                if download["id"] in self.cancelled:
+                    await self._discard(download)
+                    continue
+                task = asyncio.create_task(self._run(download))
+                self.active[download["id"]] = task
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    # On shutdown the worker itself is cancelled; keep the .part for resuming
+                    if asyncio.current_task().cancelling() or download["id"] not in self.cancelled:
+                        raise
+                    await self._discard(download)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Download {download['id']} crashed: {e}")
+            finally:
+                self.active.pop(download["id"], None)
+                self.queue.task_done()
+
+    async def _discard(self, download: Dict):
+        self.cancelled.discard(download["id"])
+        await asyncio.to_thread(self.part_path(download).unlink, missing_ok=True)
+
+    async def _run(self, download: Dict):
+        host = urllib.parse.urlsplit(download["url"]).hostname or ""
+        limit = self.host_limits.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+        async with limit:
+            for attempt in range(DOWNLOAD_MAX_RETRIES + 1):
+                try:
+                    await self._fetch(download)
+                    return
+                except DownloadFailed as e:
+                    await self._fail(download, str(e))
+                    return
+                except DownloadCancelled:
+                    await self._discard(download)
+                    return
+                except (httpx.HTTPError, OSError, PyMongoError) as e:
+                    if attempt == DOWNLOAD_MAX_RETRIES:
+                        await self._fail(download, str(e) or type(e).__name__)
+                        return
+                    self.retries += 1
+                    delay = min(DOWNLOAD_RETRY_BASE_SECONDS * 2 ** attempt, DOWNLOAD_RETRY_MAX_SECONDS)
+                    logger.warning(f"Download {download['id']} interrupted ({e!r}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def _open(self, url: str, headers: Dict) -> httpx.Response:
+        """Start a streaming GET, following redirects to http(s) URLs only"""
+        for _ in range(DOWNLOAD_MAX_REDIRECTS + 1):
+            parse_download_url(url)
+            response = await self.client.send(self.client.build_request("GET", url, headers=headers), stream=True)
+            if response.status_code not in DOWNLOAD_REDIRECT_STATUSES or "Location" not in response.headers:
+                return response
+            await response.aclose()
+            url = str(response.url.join(response.headers["Location"]))
+        raise DownloadFailed("Too many redirects")
+
+    async def _fetch(self, download: Dict):
+        part = self.part_path(download)
+        await asyncio.to_thread(part.parent.mkdir, parents=True, exist_ok=True)
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        remaining = DOWNLOAD_USER_QUOTA_BYTES - await get_user_download_usage(download["user_id"], download["id"])
+        max_bytes = min(DOWNLOAD_MAX_BYTES, remaining)
+        
+        response = await self._open(download["url"], headers)
+        try:
+            if response.status_code == 416 and offset:
+                # Everything was already received before the interruption
+                total = offset
+            else:
+                if response.status_code >= 500 or response.status_code in (408, 429):
+                    response.raise_for_status()
+                if response.status_code not in (200, 206):
+                    raise DownloadFailed(f"HTTP {response.status_code}")
+                if response.status_code == 200:
+                    offset = 0
+                elif not response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                    # Appending a range that does not start where the file ends would corrupt it
+                    await asyncio.to_thread(part.unlink, missing_ok=True)
+                    raise httpx.RemoteProtocolError(f"Range response does not start at byte {offset}")
+                total = self._total_size(response, offset)
+                if total is not None and total > max_bytes:
+                    raise DownloadFailed("File exceeds the download size limit or storage quota")
+                
+                handle = await asyncio.to_thread(open, part, "ab" if offset else "wb")
+                try:
+                    last_persist = 0.0
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                        offset += len(chunk)
+                        self.bytes_downloaded += len(chunk)
+                        if offset > max_bytes:
+                            raise DownloadFailed("File exceeds the download size limit or storage quota")
+                        await asyncio.to_thread(handle.write, chunk)
+                        now = time.monotonic()
+                        if now - last_persist >= DOWNLOAD_PROGRESS_INTERVAL_SECONDS:
+                            last_persist = now
+                            if not await self._persist_progress(download, offset, total):
+                                raise DownloadCancelled(download["id"])
+                finally:
+                    await asyncio.to_thread(handle.close)
+                if total is not None and offset < total:
+                    raise httpx.ReadError(f"Connection closed at {offset} of {total} bytes")
+                total = offset
+        finally:
+            await response.aclose()
+        
+        final = self.final_path(download)
+        await asyncio.to_thread(os.replace, part, final)
+        await self._complete(download, total, final)
+
+    @staticmethod
+    def _total_size(response: httpx.Response, offset: int) -> Optional[int]:
+        content_range = response.headers.get("Content-Range", "")
+        if response.status_code == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            return int(total) if total.isdigit() else None
+        length = response.headers.get("Content-Length")
+        return int(length) + (offset if response.status_code == 206 else 0) if length and length.isdigit() else None
+
+    async def _persist_progress(self, download: Dict, received: int, total: Optional[int]) -> bool:
+        """Record progress; False means the download was cancelled elsewhere"""
+        progress = round(received * 100.0 / total, 1) if total else 0.0
+        # Bytes received so far stand in for an unknown size when counting quota usage
+        result = await db.downloads.update_one(
+            {"id": download["id"], "status": {"$in": DOWNLOAD_ACTIVE_STATUSES}},
+            {"$set": {"status": "downloading", "progress": min(progress, 99.9), "size": total if total is not None else received}}
+        )
+        if not result.matched_count:
+            return False
+        publish_download_event(download["user_id"], download["id"], progress=min(progress, 99.9), status="downloading", size=total)
+        return True
+
+    async def _complete(self, download: Dict, size: int, path: Path):
+        self.completed += 1
+        completed = await download_progress.complete(
+            download["id"], download["user_id"], {"size": size, "download_path": str(path.relative_to(self.directory))}
+        )
+        if not completed:
+            # Deleted while the last bytes arrived; nothing will remove the file later
+            current = await db.downloads.find_one({"id": download["id"]}, {"_id": 0, "status": 1})
+            if not current or current.get("status") == "cancelled":
+                await asyncio.to_thread(path.unlink, missing_ok=True)
+
+    async def _fail(self, download: Dict, error: str):
+        self.failed += 1
+        logger.warning(f"Download {download['id']} failed: {error}")
+        await asyncio.to_thread(self.part_path(download).unlink, missing_ok=True)
+        await db.downloads.update_one(
+            {"id": download["id"], "status": {"$in": DOWNLOAD_ACTIVE_STATUSES}},
+            {"$set": {"status": "failed", "error": error}}
+        )
+        publish_download_event(download["user_id"], download["id"], status="failed", error=error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self.queue.qsize(),
+            "active": len(self.active),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "bytes_downloaded": self.bytes_downloaded
+        }
+
+    async def close(self):
+        # In-flight downloads stay "downloading" and are resumed on next start
+        for task in list(self.active.values()) + self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.active.values(), *self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+        self.queue = asyncio.Queue()
+        self.queued.clear()
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+download_engine = DownloadEngine(DOWNLOAD_DIR, DOWNLOAD_WORKERS, DOWNLOAD_PER_HOST_LIMIT)
 
 # Download Manager API Endpoints
 @app.post("/api/downloads/start")
 async def start_download(request: DownloadRequest, session_token: str = None):
     """Start a new download"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
+    try:
+        await check_download_url(request.url)
+    except (DownloadFailed, httpx.HTTPError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if await get_user_download_usage(user_id) >= DOWNLOAD_USER_QUOTA_BYTES:
+        raise HTTPException(status_code=413, detail="Download storage quota exceeded")
+    
     # Extract filename from URL if not provided
     filename = request.filename
     if not filename:
-        filename = request.url.split('/')[-1] or f"download_{uuid.uuid4()}"
+        filename = request.url.split('?')[0].split('/')[-1] or f"download_{uuid.uuid4()}"
     
     # Determine file type
     file_type = filename.split('.')[-1].lower() if '.' in filename else "unknown"
@@ -771,6 +2913,7 @@ async def start_download(request: DownloadRequest, session_token: str = None):
     
     # Insert into database
     await db.downloads.insert_one(download.dict())
+    download_engine.submit(download.dict())
     
     # Log productivity action
     await log_productivity_action(user_id, "download_started", 5, {"filename": filename})
@@ -783,77 +2926,277 @@ async def start_download(request: DownloadRequest, session_token: str = None):
     }
 
 @app.get("/api/downloads")
-async def get_downloads(session_token: str = None):
-    """Get all downloads for user"""
-    user_id = get_current_user(session_token)
+async def get_downloads(session_token: str = None, limit: int = LIST_PAGE_SIZE, cursor: Optional[str] = None, fields: Optional[str] = None):
+    """Get a page of downloads for user"""
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
-    downloads = await db.downloads.find({"user_id": user_id}).sort("created_date", -1).to_list(100)
-    
-    # Convert MongoDB documents to JSON serializable format
-    converted_downloads = convert_mongo_doc(downloads)
+    projection = build_list_projection(fields, set(Download.model_fields), "created_date")
+    downloads, next_cursor = await paginate_user_collection(
+        db.downloads, user_id, "created_date", limit, cursor, projection
+    )
     
-    return {"downloads": converted_downloads}
+    return MongoJSONResponse({"downloads": downloads, "next_cursor": next_cursor})
 
 @app.get("/api/downloads/{download_id}/status")
 async def get_download_status(download_id: str, session_token: str = None):
     """Get download status"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     
-    download = await db.downloads.find_one({"id": download_id, "user_id": user_id})
+    download = await db.downloads.find_one({"id": download_id, "user_id": user_id}, {"_id": 0})
     
     if not download:
         raise HTTPException(status_code=404, detail="Download not found")
     
-    converted_download = convert_mongo_doc(download)
-    return {"download": converted_download}
+    # Progress reported since the last flush is newer than the stored copy
+    live = download_progress.get(download_id, user_id)
+    if live and download.get("status") not in DOWNLOAD_TERMINAL_STATUSES:
+        download.update(live)
+    
+    return MongoJSONResponse({"download": download})
 
 @app.put("/api/downloads/{download_id}/progress")
 async def update_download_progress(download_id: str, progress_data: dict, session_token: str = None):
     """Update download progress"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     
     progress = progress_data.get("progress", 0.0)
     status = progress_data.get("status", "downloading")
     
-    update_data = {
-        "progress": progress,
-        "status": status
-    }
-    
-    if progress >= 100.0 or status == "completed":
-        update_data["completed_date"] = datetime.now()
-        update_data["status"] = "completed"
-        # Award completion points
-        await log_productivity_action(user_id, "download_completed", 10, {"download_id": download_id})
+    # Downloads are fetched server-side; clients may not finish, fail or override them
+    if status not in DOWNLOAD_ACTIVE_STATUSES or progress >= 100.0:
+        raise HTTPException(status_code=409, detail="Download status is set by the download engine")
+    if download_engine.owns(download_id):
+        raise HTTPException(status_code=409, detail="Progress for this download is reported by the download engine")
     
-    await db.downloads.update_one(
-        {"id": download_id, "user_id": user_id},
-        {"$set": update_data}
-    )
+    # Buffered in memory; written on the next flush or on a status change
+    await download_progress.report(download_id, user_id, progress, status)
     
     return {"success": True, "message": "Progress updated"}
 
 @app.delete("/api/downloads/{download_id}")
 async def cancel_download(download_id: str, session_token: str = None):
     """Cancel/delete download"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     
-    result = await db.downloads.update_one(
-        {"id": download_id, "user_id": user_id},
-        {"$set": {"status": "cancelled"}}
+    download = await db.downloads.find_one_and_update(
+        {"id": download_id, "user_id": user_id, "status": {"$ne": "cancelled"}},
+        {"$set": {"status": "cancelled"}},
+        {"_id": 0, "download_path": 1}
     )
     
-    if result.modified_count == 0:
+    if download is None:
         raise HTTPException(status_code=404, detail="Download not found")
     
+    download_engine.cancel(download_id)
+    download_progress.discard(download_id)
+    if download.get("download_path"):
+        await download_engine.remove(download["download_path"])
+    publish_download_event(user_id, download_id, status="cancelled")
+    
     return {"success": True, "message": "Download cancelled"}
 
+@app.get("/api/stream/downloads")
+async def stream_downloads(request: Request, session_token: str = None):
+    """Push download progress for the current user as server-sent events"""
+    user_id = await get_current_user(session_token)
+    return event_hub.response(f"downloads:{user_id}", request)
+
 # Document Management API Endpoints  
+# Document search
+SEARCH_TOKEN_PATTERN = re.compile(r"\w+")
+SEARCH_MIN_TOKEN_LENGTH = 2
+SEARCH_MAX_TERMS = 5000
+SEARCH_SNIPPET_CHARS = 160
+SEARCH_SNIPPET_LEAD = 40
+SEARCH_BACKFILL_BATCH = 500
+# Words the English text index drops; a $text search made only of these matches nothing
+SEARCH_STOP_WORDS = frozenset("""
+    a about above after again against all am an and any are as at be because been before being below
+    between both but by can did do does doing down during each few for from further had has have having
+    he her here hers herself him himself his how if in into is it its itself just me more most my myself
+    no nor not now of off on once only or other our ours ourselves out over own same she should so some
+    such than that the their theirs them themselves then there these they this those through to too
+    under until up very was we were what when where which while who whom why will with you your yours
+    yourself yourselves
+""".split())
+
+def tokenize_search_text(text: str) -> List[str]:
+    return [token for token in SEARCH_TOKEN_PATTERN.findall(text.lower()) if len(token) >= SEARCH_MIN_TOKEN_LENGTH]
+
+def document_search_terms(title: str, content: str, tags: List[str]) -> List[str]:
+    """Distinct lowercase tokens of a document, kept for prefix matching.
+    
+    Past SEARCH_MAX_TERMS the words seen first are kept, so the title, tags
+    and opening of a long document stay searchable.
+    """
+    terms = dict.fromkeys(tokenize_search_text(" ".join([title, *tags, content])))
+    return list(terms)[:SEARCH_MAX_TERMS]
+
+def highlight_offsets(text: str, tokens: List[str]) -> List[List[int]]:
+    """[start, end) offsets of words in `text` that start with a query token"""
+    offsets = []
+    for match in SEARCH_TOKEN_PATTERN.finditer(text.lower()):
+        word = match.group()
+        for token in tokens:
+            if word.startswith(token):
+                offsets.append([match.start(), match.start() + len(token)])
+                break
+    return offsets
+
+async def backfill_document_search_terms():
+    """Index documents written before search terms were maintained"""
+    backfilled = 0
+    while True:
+        documents = await db.documents.find(
+            {"search_terms": {"$exists": False}}, {"_id": 0, "id": 1, "user_id": 1, "title": 1, "content": 1, "tags": 1}
+        ).limit(SEARCH_BACKFILL_BATCH).to_list(SEARCH_BACKFILL_BATCH)
+        if not documents:
+            break
+        await db.documents.bulk_write([
+            UpdateOne(
+                {"id": document["id"], "user_id": document["user_id"]},
+                {"$set": {"search_terms": document_search_terms(
+                    document.get("title", ""), document.get("content", ""), document.get("tags") or []
+                )}}
+            )
+            for document in documents
+        ], ordered=False)
+        backfilled += len(documents)
+    if backfilled:
+        logger.info(f"Backfilled search terms for {backfilled} documents")
+
+# Document revisions
+DOCUMENT_SNAPSHOT_INTERVAL = int(os.environ.get("DOCUMENT_SNAPSHOT_INTERVAL", 25))
+DOCUMENT_REVISION_LIMIT = int(os.environ.get("DOCUMENT_REVISION_LIMIT", 500))
+DOCUMENT_EDIT_POINTS_INTERVAL = timedelta(seconds=float(os.environ.get("DOCUMENT_EDIT_POINTS_INTERVAL_SECONDS", 300)))
+DOCUMENT_VERSION_FIELDS = ("title", "content", "tags", "category")
+DOCUMENT_SAVE_ATTEMPTS = 3
+
+def apply_text_edits(content: str, edits: List[Dict]) -> str:
+    """Apply non-overlapping [start, end) replacements given against `content`"""
+    previous_end = 0
+    for edit in edits:
+        if edit["start"] < previous_end or edit["end"] < edit["start"] or edit["end"] > len(content):
+            raise HTTPException(status_code=422, detail="Edits must be ordered, non-overlapping and within the document")
+        previous_end = edit["end"]
+    for edit in reversed(edits):
+        content = content[:edit["start"]] + edit["text"] + content[edit["end"]:]
+    return content
+
+def diff_text(old: str, new: str) -> List[Dict]:
+    """Express `new` as at most one replacement in `old`, keeping the common prefix and suffix"""
+    if old == new:
+        return []
+    prefix = len(os.path.commonprefix([old, new]))
+    suffix = len(os.path.commonprefix([old[prefix:][::-1], new[prefix:][::-1]]))
+    return [{"start": prefix, "end": len(old) - suffix, "text": new[prefix:len(new) - suffix]}]
+
+def apply_revision(version: Dict, revision: Dict) -> Dict:
+    if "snapshot" in revision:
+        return dict(revision["snapshot"])
+    version = {**version, **revision.get("set", {})}
+    version["content"] = apply_text_edits(version["content"], revision.get("edits", []))
+    return version
+
+async def record_document_revision(document_id: str, user_id: str, revision: int,
+                                   version: Optional[Dict] = None, edits: Optional[List[Dict]] = None,
+                                   changed: Optional[Dict] = None):
+    """Store a revision as a delta, or as a full snapshot when `version` is given"""
+    record = {"document_id": document_id, "user_id": user_id, "revision": revision, "created_date": datetime.now()}
+    if version is None:
+        record["edits"] = edits or []
+        record["set"] = changed or {}
+        await db.document_revisions.insert_one(record)
+        return
+    
+    record["snapshot"] = {field: version[field] for field in DOCUMENT_VERSION_FIELDS}
+    await db.document_revisions.replace_one({"document_id": document_id, "revision": revision}, record, upsert=True)
+    
+    if version is not None and revision > DOCUMENT_REVISION_LIMIT:
+        await prune_document_revisions(document_id, revision - DOCUMENT_REVISION_LIMIT)
+
+async def prune_document_revisions(document_id: str, keep_from: int):
+    """Drop history older than the newest snapshot at or before `keep_from`"""
+    base = await db.document_revisions.find_one(
+        {"document_id": document_id, "revision": {"$lte": keep_from}, "snapshot": {"$exists": True}},
+        {"_id": 0, "revision": 1},
+        sort=[("revision", -1)]
+    )
+    if base:
+        await db.document_revisions.delete_many({"document_id": document_id, "revision": {"$lt": base["revision"]}})
+
+async def reconstruct_document(document_id: str, user_id: str, revision: int) -> Dict:
+    """Rebuild a version from the nearest snapshot plus the deltas after it"""
+    base = await db.document_revisions.find_one(
+        {"document_id": document_id, "user_id": user_id, "revision": {"$lte": revision}, "snapshot": {"$exists": True}},
+        {"_id": 0},
+        sort=[("revision", -1)]
+    )
+    if not base:
+        raise HTTPException(status_code=404, detail="Revision not available")
+    
+    deltas = await db.document_revisions.find(
+        {"document_id": document_id, "user_id": user_id, "revision": {"$gt": base["revision"], "$lte": revision}},
+        {"_id": 0}
+    ).sort("revision", 1).to_list(None)
+    if len(deltas) != revision - base["revision"]:
+        raise HTTPException(status_code=404, detail="Revision not available")
+    
+    version = dict(base["snapshot"])
+    for delta in deltas:
+        version = apply_revision(version, delta)
+    return version
+
+async def commit_document_revision(document_id: str, user_id: str, document: Dict,
+                                   edits: List[Dict], changed: Dict) -> Optional[tuple]:
+    """Write the next revision of `document` if it is still current.
+    
+    Returns (revision, points_earned), or None when another save got there
+    first. Edit points are awarded at most once per
+    DOCUMENT_EDIT_POINTS_INTERVAL.
+    """
+    version = {**document, **changed, "content": apply_text_edits(document["content"], edits)}
+    revision = document.get("revision", 0) + 1
+    
+    now = datetime.now()
+    update_data = {
+        **changed,
+        "content": version["content"],
+        "revision": revision,
+        "modified_date": now,
+        "search_terms": document_search_terms(version["title"], version["content"], version["tags"])
+    }
+    last_awarded = document.get("points_awarded_date")
+    award_points = last_awarded is None or now - last_awarded >= DOCUMENT_EDIT_POINTS_INTERVAL
+    if award_points:
+        update_data["points_awarded_date"] = now
+    
+    if "revision" not in document:
+        # Documents created before revision history need a base snapshot
+        await record_document_revision(document_id, user_id, 0, version=document)
+    
+    # The revision filter makes this a compare-and-set against the version read
+    result = await db.documents.update_one(
+        {"id": document_id, "user_id": user_id, "revision": document.get("revision")},
+        {"$set": update_data}
+    )
+    if result.modified_count == 0:
+        return None
+    
+    if revision % DOCUMENT_SNAPSHOT_INTERVAL == 0:
+        await record_document_revision(document_id, user_id, revision, version=version)
+    else:
+        await record_document_revision(document_id, user_id, revision, edits=edits, changed=changed)
+    
+    if award_points:
+        await log_productivity_action(user_id, "document_updated", 5, {"title": version["title"]})
+    return revision, 5 if award_points else 0
+
 @app.post("/api/documents")
 async def create_document(request: DocumentRequest, session_token: str = None):
     """Create a new document"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
     document = Document(
@@ -864,7 +3207,11 @@ async def create_document(request: DocumentRequest, session_token: str = None):
         category=request.category or "general"
     )
     
-    await db.documents.insert_one(document.dict())
+    await db.documents.insert_one({
+        **document.dict(),
+        "search_terms": document_search_terms(document.title, document.content, document.tags)
+    })
+    await record_document_revision(document.id, user_id, 0, version=document.dict())
     await log_productivity_action(user_id, "document_created", 10, {"title": request.title})
     
     return {
@@ -875,114 +3222,327 @@ async def create_document(request: DocumentRequest, session_token: str = None):
     }
 
 @app.get("/api/documents")
-async def get_documents(session_token: str = None):
-    """Get all documents for user"""
-    user_id = get_current_user(session_token)
+async def get_documents(session_token: str = None, limit: int = LIST_PAGE_SIZE, cursor: Optional[str] = None, fields: Optional[str] = None):
+    """Get a page of document summaries for user (pass fields=content,... for bodies)"""
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
-    documents = await db.documents.find({"user_id": user_id}).sort("modified_date", -1).to_list(100)
-    converted_documents = convert_mongo_doc(documents)
+    projection = build_list_projection(fields, set(Document.model_fields), "modified_date", DOCUMENT_SUMMARY_FIELDS)
+    documents, next_cursor = await paginate_user_collection(
+        db.documents, user_id, "modified_date", limit, cursor, projection
+    )
     
-    return {"documents": converted_documents}
+    return MongoJSONResponse({"documents": documents, "next_cursor": next_cursor})
+
+@app.get("/api/documents/search")
+async def search_documents(q: str = "", tags: Optional[str] = None, limit: int = LIST_PAGE_SIZE, session_token: str = None):
+    """Ranked search over document titles, content and tags.
+
+    Whole words go through the text index; the last word is also matched
+    as a prefix. Snippets are cut in the database so bodies never leave it.
+    """
+    user_id = await get_current_user(session_token)
+    
+    tokens = tokenize_search_text(q)
+    tag_filter = [tag.strip() for tag in (tags or "").split(",") if tag.strip()]
+    if not tokens and not tag_filter:
+        raise HTTPException(status_code=400, detail="Provide a search query or tags")
+    limit = max(1, min(limit, LIST_MAX_PAGE_SIZE))
+    
+    match: Dict[str, Any] = {"user_id": user_id}
+    if tag_filter:
+        match["tags"] = {"$all": tag_filter}
+    score: Any = {"$literal": 0}
+    if tokens:
+        whole = [token for token in tokens[:-1] if token not in SEARCH_STOP_WORDS]
+        prefix = tokens[-1]
+        if whole:
+            match["$text"] = {"$search": " ".join(whole)}
+            score = {"$meta": "textScore"}
+        match["search_terms"] = {"$regex": f"^{re.escape(prefix)}"}
+        title_boost = {"$cond": [{"$regexMatch": {"input": "$title", "regex": f"\\b{re.escape(prefix)}", "options": "i"}}, 1, 0]}
+        score = {"$add": [score, title_boost]}
+        position = {"$indexOfCP": [{"$toLower": "$content"}, prefix]}
+    else:
+        position = -1
+    
+    pipeline = [
+        {"$match": match},
+        {"$project": {
+            "_id": 0,
+            **{field: 1 for field in DOCUMENT_SUMMARY_FIELDS},
+            "id": 1,
+            "score": score,
+            "snippet_offset": {"$max": [0, {"$subtract": [position, SEARCH_SNIPPET_LEAD]}]},
+            "content": 1
+        }},
+        {"$set": {"snippet": {"$substrCP": ["$content", "$snippet_offset", SEARCH_SNIPPET_CHARS]}}},
+        {"$project": {"content": 0}},
+        {"$sort": {"score": -1, "modified_date": -1, "id": -1}},
+        {"$limit": limit}
+    ]
+    documents = await db.documents.aggregate(pipeline).to_list(limit)
+    
+    for document in documents:
+        document["highlights"] = {
+            "title": highlight_offsets(document.get("title", ""), tokens),
+            "snippet": highlight_offsets(document["snippet"], tokens)
+        }
+    
+    return MongoJSONResponse({"query": q, "tags": tag_filter, "documents": documents})
 
 @app.get("/api/documents/{document_id}")
 async def get_document(document_id: str, session_token: str = None):
     """Get specific document"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     
-    document = await db.documents.find_one({"id": document_id, "user_id": user_id})
+    document = await db.documents.find_one({"id": document_id, "user_id": user_id}, {"_id": 0, "search_terms": 0})
     
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    converted_document = convert_mongo_doc(document)
-    return {"document": converted_document}
+    return MongoJSONResponse({"document": document})
 
 @app.put("/api/documents/{document_id}")
 async def update_document(document_id: str, request: DocumentRequest, session_token: str = None):
-    """Update document"""
-    user_id = get_current_user(session_token)
+    """Update document, storing the change as a revision delta"""
+    user_id = await get_current_user(session_token)
     
-    update_data = {
+    replacement = {
         "title": request.title,
         "content": request.content,
         "tags": request.tags or [],
-        "category": request.category or "general",
-        "modified_date": datetime.now()
+        "category": request.category or "general"
     }
     
-    result = await db.documents.update_one(
-        {"id": document_id, "user_id": user_id},
-        {"$set": update_data}
-    )
+    # Last writer wins: retry if a concurrent save moved the revision on
+    for _ in range(DOCUMENT_SAVE_ATTEMPTS):
+        document = await db.documents.find_one(
+            {"id": document_id, "user_id": user_id},
+            {"_id": 0, "title": 1, "content": 1, "tags": 1, "category": 1, "revision": 1, "points_awarded_date": 1}
+        )
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        changed = {field: replacement[field] for field in ("title", "tags", "category") if document.get(field) != replacement[field]}
+        edits = diff_text(document.get("content", ""), request.content)
+        if not edits and not changed and "revision" in document:
+            # An autosave with nothing new stores nothing
+            return {"success": True, "message": "Document unchanged", "revision": document["revision"], "points_earned": 0}
+        
+        committed = await commit_document_revision(document_id, user_id, document, edits, changed)
+        if committed:
+            revision, points_earned = committed
+            return {"success": True, "message": "Document updated successfully", "revision": revision, "points_earned": points_earned}
+    
+    raise HTTPException(status_code=409, detail="Document is being updated concurrently")
+
+@app.patch("/api/documents/{document_id}")
+async def patch_document(document_id: str, request: DocumentPatchRequest, session_token: str = None):
+    """Apply text edits to a document if it is still at `base_revision`"""
+    user_id = await get_current_user(session_token)
+    
+    document = await db.documents.find_one(
+        {"id": document_id, "user_id": user_id},
+        {"_id": 0, "title": 1, "content": 1, "tags": 1, "category": 1, "revision": 1, "points_awarded_date": 1}
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    current_revision = document.get("revision", 0)
+    if request.base_revision != current_revision:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Document has changed since base_revision", "revision": current_revision}
+        )
+    
+    edits = [edit.dict() for edit in request.edits]
+    changed = {
+        field: value for field, value in
+        (("title", request.title), ("tags", request.tags), ("category", request.category))
+        if value is not None
+    }
+    committed = await commit_document_revision(document_id, user_id, document, edits, changed)
+    if committed is None:
+        raise HTTPException(status_code=409, detail={"message": "Document has changed since base_revision"})
+    
+    revision, points_earned = committed
+    return {"success": True, "revision": revision, "points_earned": points_earned}
+
+@app.get("/api/documents/{document_id}/revisions")
+async def get_document_revisions(document_id: str, session_token: str = None, limit: int = LIST_PAGE_SIZE):
+    """List a document's stored revisions, newest first"""
+    user_id = await get_current_user(session_token)
+    limit = max(1, min(limit, LIST_MAX_PAGE_SIZE))
+    
+    revisions = await db.document_revisions.aggregate([
+        {"$match": {"document_id": document_id, "user_id": user_id}},
+        {"$sort": {"revision": -1}},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0,
+            "revision": 1,
+            "created_date": 1,
+            "snapshot": {"$ne": [{"$type": "$snapshot"}, "missing"]},
+            "edits": {"$size": {"$ifNull": ["$edits", []]}},
+            "changed_fields": {"$map": {"input": {"$objectToArray": {"$ifNull": ["$set", {}]}}, "in": "$$this.k"}}
+        }}
+    ]).to_list(limit)
     
-    if result.modified_count == 0:
+    if not revisions:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    await log_productivity_action(user_id, "document_updated", 5, {"title": request.title})
+    return MongoJSONResponse({"revisions": revisions})
+
+@app.get("/api/documents/{document_id}/revisions/{revision}")
+async def get_document_revision(document_id: str, revision: int, session_token: str = None):
+    """Reconstruct a document as it was at `revision`"""
+    user_id = await get_current_user(session_token)
+    
+    version = await reconstruct_document(document_id, user_id, revision)
     
-    return {"success": True, "message": "Document updated successfully", "points_earned": 5}
+    return MongoJSONResponse({"document_id": document_id, "revision": revision, **version})
 
 @app.delete("/api/documents/{document_id}")
 async def delete_document(document_id: str, session_token: str = None):
     """Delete document"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     
     result = await db.documents.delete_one({"id": document_id, "user_id": user_id})
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    await db.document_revisions.delete_many({"document_id": document_id, "user_id": user_id})
+    
     return {"success": True, "message": "Document deleted successfully"}
 
 # Weather API Endpoints
+WEATHER_CACHE_MAX_ENTRIES = int(os.environ.get("WEATHER_CACHE_MAX_ENTRIES", 1000))
+WEATHER_CURRENT_TTL = timedelta(minutes=30)
+WEATHER_ENHANCED_TTL = timedelta(minutes=15)  # Shorter cache for enhanced data
+
+def normalize_location(location: str) -> str:
+    """Case- and whitespace-insensitive cache key for a location"""
+    return " ".join(location.split()).lower()
+
+class WeatherCacheTier:
+    """In-process TTL+LRU cache in front of db.weather_cache.
+
+    Lookups check the local map first, then Mongo, and only then generate
+    new data. Concurrent misses for the same key share one in-flight load,
+    so a burst of requests for a location regenerates it once.
+    """
+
+    def __init__(self, collection, max_entries: int):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.local: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.inflight: Dict[tuple, asyncio.Task] = {}
+        self.local_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _remember(self, key: tuple, expires_at: datetime, data: Dict[str, Any]):
+        self.local[key] = (expires_at, data)
+        self.local.move_to_end(key)
+        while len(self.local) > self.max_entries:
+            self.local.popitem(last=False)
+
+    async def get(self, kind: str, location: str, ttl: timedelta, generate) -> tuple:
+        """Return (weather_data, cached) for location, generating it on a miss"""
+        key = (kind, normalize_location(location))
+        entry = self.local.get(key)
+        if entry and entry[0] > utc_now():
+            self.local.move_to_end(key)
+            self.local_hits += 1
+            telemetry.record_cache("weather", True)
+            return entry[1], True
+        
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, ttl, generate))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one cancelled caller doesn't cancel the shared load
+        return await asyncio.shield(task)
+
+    async def _load(self, key: tuple, ttl: timedelta, generate) -> tuple:
+        kind, location = key
+        # UTC, since expires_at feeds the TTL index
+        now = utc_now()
+        
+        cached = await self.collection.find_one(
+            {"location": location, "kind": kind, "expires_at": {"$gt": now}},
+            {"_id": 0, "weather_data": 1, "expires_at": 1}
+        )
+        if cached:
+            self.db_hits += 1
+            telemetry.record_cache("weather", True)
+            self._remember(key, cached["expires_at"], cached["weather_data"])
+            return cached["weather_data"], True
+        
+        self.misses += 1
+        telemetry.record_cache("weather", False)
+        weather_data = generate()
+        expires_at = now + ttl
+        self._remember(key, expires_at, weather_data)
+        
+        try:
+            await self.collection.update_one(
+                {"location": location, "kind": kind},
+                {"$set": {
+                    "id": str(uuid.uuid4()),
+                    "location": location,
+                    "kind": kind,
+                    "weather_data": weather_data,
+                    "cached_date": now,
+                    "expires_at": expires_at
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Weather cache write failed for {location}: {e}")
+        
+        return weather_data, False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.local),
+            "local_hits": self.local_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced
+        }
+
+weather_cache = WeatherCacheTier(db.weather_cache, WEATHER_CACHE_MAX_ENTRIES)
+
+def generate_current_weather() -> Dict[str, Any]:
+    """Mock current weather data for demo"""
+    # In production, you would integrate with actual weather API
+    return {
+        "temperature": random.randint(15, 30),
+        "condition": random.choice(["Sunny", "Cloudy", "Partly Cloudy", "Rain", "Snow"]),
+        "humidity": random.randint(30, 80),
+        "wind_speed": random.randint(5, 25),
+        "description": "Mock weather data for demo",
+        "icon": "☀️" if random.choice([True, False]) else "☁️"
+    }
+
 @app.get("/api/weather/current")
 async def get_current_weather(location: str = "New York"):
     """Get current weather data (cached)"""
     try:
-        # Check cache first
-        cached_weather = await db.weather_cache.find_one({"location": location})
-        
-        if cached_weather and cached_weather.get("expires_at", datetime.min) > datetime.now():
-            return {
-                "success": True,
-                "location": location,
-                "weather": cached_weather["weather_data"],
-                "cached": True
-            }
-        
-        # For demo purposes, return mock weather data
-        # In production, you would integrate with actual weather API
-        mock_weather = {
-            "temperature": random.randint(15, 30),
-            "condition": random.choice(["Sunny", "Cloudy", "Partly Cloudy", "Rain", "Snow"]),
-            "humidity": random.randint(30, 80),
-            "wind_speed": random.randint(5, 25),
-            "description": "Mock weather data for demo",
-            "icon": "☀️" if random.choice([True, False]) else "☁️"
-        }
-        
-        # Cache the data for 30 minutes
-        cache_entry = {
-            "id": str(uuid.uuid4()),
-            "location": location,
-            "weather_data": mock_weather,
-            "cached_date": datetime.now(),
-            "expires_at": datetime.now() + timedelta(minutes=30)
-        }
-        
-        # Update cache
-        await db.weather_cache.update_one(
-            {"location": location},
-            {"$set": cache_entry},
-            upsert=True
-        )
+        weather, cached = await weather_cache.get("current", location, WEATHER_CURRENT_TTL, generate_current_weather)
         
         return {
             "success": True,
             "location": location,
-            "weather": mock_weather,
-            "cached": False
+            "weather": weather,
+            "cached": cached
         }
         
     except Exception as e:
@@ -990,104 +3550,18 @@ async def get_current_weather(location: str = "New York"):
 
 # RelocateMe API Endpoints
 @app.get("/api/relocateme/opportunities")
-async def get_relocate_opportunities():
+async def get_relocate_opportunities(request: Request):
     """Get global relocation opportunities"""
     try:
         # In production, this would connect to real RelocateMe API
-        opportunities = [
-            {
-                "id": "relocate_001",
-                "title": "Senior Software Engineer - Berlin Tech Hub",
-                "company": "EuroTech Solutions GmbH",
-                "location": "Berlin, Germany",
-                "salary": "€85,000 - €110,000",
-                "relocation_package": {
-                    "visa_support": True,
-                    "moving_allowance": "€8,000",
-                    "temporary_housing": "3 months",
-                    "language_training": True,
-                    "family_support": True
-                },
-                "benefits": [
-                    "Full relocation assistance",
-                    "EU work visa sponsorship", 
-                    "Language learning budget",
-                    "Family relocation support",
-                    "Cultural integration program"
-                ],
-                "requirements": ["5+ years experience", "EU eligibility", "English fluency"],
-                "deadline": "2024-08-15",
-                "source": "RelocateMe",
-                "posted_date": datetime.now().isoformat()
-            },
-            {
-                "id": "relocate_002",
-                "title": "Full Stack Developer - Toronto Innovation District",
-                "company": "CanadaTech Corp",
-                "location": "Toronto, Canada", 
-                "salary": "CAD $95,000 - $125,000",
-                "relocation_package": {
-                    "visa_support": True,
-                    "moving_allowance": "CAD $12,000",
-                    "temporary_housing": "2 months",
-                    "language_training": False,
-                    "family_support": True
-                },
-                "benefits": [
-                    "Express Entry support",
-                    "Comprehensive health coverage",
-                    "Relocation bonus",
-                    "Career development fund",
-                    "Immigration lawyer assistance"
-                ],
-                "requirements": ["3+ years experience", "Bachelor's degree", "English proficiency"],
-                "deadline": "2024-07-30",
-                "source": "RelocateMe",
-                "posted_date": datetime.now().isoformat()
-            },
-            {
-                "id": "relocate_003",
-                "title": "Data Scientist - Sydney Tech Quarter",
-                "company": "AussieTech Innovations",
-                "location": "Sydney, Australia",
-                "salary": "AUD $110,000 - $140,000",
-                "relocation_package": {
-                    "visa_support": True,
-                    "moving_allowance": "AUD $15,000",
-                    "temporary_housing": "6 weeks",
-                    "language_training": False,
-                    "family_support": True
-                },
-                "benefits": [
-                    "Skilled visa sponsorship",
-                    "Moving cost coverage",
-                    "Airport pickup service",
-                    "Orientation program",
-                    "Housing search assistance"
-                ],
-                "requirements": ["Masters in relevant field", "Python/R expertise", "English proficiency"],
-                "deadline": "2024-09-01",
-                "source": "RelocateMe",
-                "posted_date": datetime.now().isoformat()
-            }
-        ]
-        
-        return {
-            "success": True,
-            "opportunities": opportunities,
-            "total_opportunities": len(opportunities),
-            "featured_countries": ["Germany", "Canada", "Australia", "Netherlands", "Singapore"],
-            "success_stories": 127,
-            "active_relocations": 34
-        }
-        
+        return static_content.respond("relocate_opportunities", request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RelocateMe service error: {str(e)}")
 
 @app.post("/api/relocateme/apply")
 async def apply_relocate_opportunity(application_data: dict, session_token: str = None):
     """Submit application via RelocateMe"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
     try:
@@ -1109,6 +3583,7 @@ async def apply_relocate_opportunity(application_data: dict, session_token: str
         
         # Store application in database
         await db.relocate_applications.insert_one(application)
+        await bump_user_counters(user_id, applications=1)
         
         # Award points for applying
         await log_productivity_action(user_id, "relocate_application", 25, {
@@ -1134,149 +3609,81 @@ async def apply_relocate_opportunity(application_data: dict, session_token: str
 
 # Enhanced Live Data Endpoints
 @app.get("/api/news/live")
-async def get_live_news():
+async def get_live_news(request: Request):
     """Get real-time news feed"""
     try:
         # In production, integrate with NewsAPI or similar
-        news_items = [
-            {
-                "id": str(uuid.uuid4()),
-                "title": "AI Revolution Transforms Remote Work Industry",
-                "description": "Latest developments in AI technology are reshaping how remote teams collaborate and increasing productivity by 40%.",
-                "source": "TechNews Daily",
-                "category": "Technology",
-                "published_at": datetime.now().isoformat(),
-                "url": "https://technews.com/ai-remote-work",
-                "image": "https://images.unsplash.com/photo-1677442136019-21780ecad995?w=300&h=200&fit=crop"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "title": "Global Remote Job Market Reaches Record High in 2024",
-                "description": "Remote job opportunities increased by 300% this year, with tech, healthcare, and finance leading the growth.",
-                "source": "WorkTrends Report",
-                "category": "Employment",
-                "published_at": (datetime.now() - timedelta(hours=2)).isoformat(),
-                "url": "https://worktrends.com/remote-jobs-2024",
-                "image": "https://images.unsplash.com/photo-1516321318423-f06f85e504b3?w=300&h=200&fit=crop"
-            },
+        return static_content.respond("news_live", request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"News service error: {str(e)}")
+
+# Enhanced weather endpoint with real API integration simulation
+def generate_enhanced_weather() -> Dict[str, Any]:
+    """Mock enhanced weather data with forecast and air quality"""
+    # Simulate enhanced weather API response
+    weather_conditions = ["Clear", "Clouds", "Rain", "Snow", "Thunderstorm", "Drizzle", "Mist"]
+    selected_condition = random.choice(weather_conditions)
+    
+    return {
+        "temperature": random.randint(10, 35),
+        "condition": selected_condition,
+        "description": f"{selected_condition.lower()} skies with good visibility",
+        "humidity": random.randint(30, 90),
+        "wind_speed": random.randint(5, 30),
+        "pressure": random.randint(980, 1040),
+        "visibility": random.randint(5, 20),
+        "uv_index": random.randint(1, 11),
+        "feels_like": random.randint(8, 38),
+        "sunrise": "06:30 AM",
+        "sunset": "07:45 PM",
+        "forecast": [
             {
-                "id": str(uuid.uuid4()),
-                "title": "RelocateMe Reports 200% Increase in Tech Relocations",
-                "description": "Tech professionals are increasingly seeking opportunities abroad, with Berlin, Toronto, and Sydney as top destinations.",
-                "source": "Migration Weekly",
-                "category": "Relocation",
-                "published_at": (datetime.now() - timedelta(hours=4)).isoformat(),
-                "url": "https://migrationweekly.com/tech-relocations",
-                "image": "https://images.unsplash.com/photo-1526778548025-fa2f459cd5c1?w=300&h=200&fit=crop"
+                "day": "Today",
+                "high": random.randint(20, 30),
+                "low": random.randint(10, 20),
+                "condition": random.choice(weather_conditions),
+                "precipitation": f"{random.randint(0, 40)}%"
             },
             {
-                "id": str(uuid.uuid4()),
-                "title": "New Study: Remote Workers 40% More Productive Than Office",
-                "description": "Comprehensive study of 50,000 workers shows remote employees demonstrate higher productivity and job satisfaction.",
-                "source": "Productivity Institute",
-                "category": "Research",
-                "published_at": (datetime.now() - timedelta(hours=6)).isoformat(),
-                "url": "https://productivity-institute.com/remote-study",
-                "image": "https://images.unsplash.com/photo-1551836022-deb4988cc6c0?w=300&h=200&fit=crop"
+                "day": "Tomorrow", 
+                "high": random.randint(20, 30),
+                "low": random.randint(10, 20),
+                "condition": random.choice(weather_conditions),
+                "precipitation": f"{random.randint(0, 40)}%"
             },
             {
-                "id": str(uuid.uuid4()),
-                "title": "Tech Giants Announce Permanent Remote Work Policies",
-                "description": "Major technology companies including Meta, Twitter, and Spotify announce permanent remote-first policies.",
-                "source": "Business Today",
-                "category": "Business",
-                "published_at": (datetime.now() - timedelta(hours=8)).isoformat(),
-                "url": "https://businesstoday.com/tech-remote-policies",
-                "image": "https://images.unsplash.com/photo-1556075798-4825dfaaf498?w=300&h=200&fit=crop"
+                "day": "Day 3",
+                "high": random.randint(20, 30),
+                "low": random.randint(10, 20),
+                "condition": random.choice(weather_conditions),
+                "precipitation": f"{random.randint(0, 40)}%"
+            }
+        ],
+        "alerts": [],
+        "air_quality": {
+            "aqi": random.randint(25, 150),
+            "category": "Good" if random.choice([True, False]) else "Moderate",
+            "pollutants": {
+                "pm25": random.randint(5, 35),
+                "pm10": random.randint(10, 50),
+                "ozone": random.randint(20, 80)
             }
-        ]
-        
-        return {
-            "success": True,
-            "news": news_items,
-            "total": len(news_items),
-            "last_updated": datetime.now().isoformat()
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"News service error: {str(e)}")
+    }
 
-# Enhanced weather endpoint with real API integration simulation
 @app.get("/api/weather/enhanced")
 async def get_enhanced_weather(location: str = "New York"):
     """Get enhanced weather data with more details"""
     try:
-        # Simulate enhanced weather API response
-        weather_conditions = ["Clear", "Clouds", "Rain", "Snow", "Thunderstorm", "Drizzle", "Mist"]
-        selected_condition = random.choice(weather_conditions)
-        
-        enhanced_weather = {
-            "temperature": random.randint(10, 35),
-            "condition": selected_condition,
-            "description": f"{selected_condition.lower()} skies with good visibility",
-            "humidity": random.randint(30, 90),
-            "wind_speed": random.randint(5, 30),
-            "pressure": random.randint(980, 1040),
-            "visibility": random.randint(5, 20),
-            "uv_index": random.randint(1, 11),
-            "feels_like": random.randint(8, 38),
-            "sunrise": "06:30 AM",
-            "sunset": "07:45 PM",
-            "forecast": [
-                {
-                    "day": "Today",
-                    "high": random.randint(20, 30),
-                    "low": random.randint(10, 20),
-                    "condition": random.choice(weather_conditions),
-                    "precipitation": f"{random.randint(0, 40)}%"
-                },
-                {
-                    "day": "Tomorrow", 
-                    "high": random.randint(20, 30),
-                    "low": random.randint(10, 20),
-                    "condition": random.choice(weather_conditions),
-                    "precipitation": f"{random.randint(0, 40)}%"
-                },
-                {
-                    "day": "Day 3",
-                    "high": random.randint(20, 30),
-                    "low": random.randint(10, 20),
-                    "condition": random.choice(weather_conditions),
-                    "precipitation": f"{random.randint(0, 40)}%"
-                }
-            ],
-            "alerts": [],
-            "air_quality": {
-                "aqi": random.randint(25, 150),
-                "category": "Good" if random.choice([True, False]) else "Moderate",
-                "pollutants": {
-                    "pm25": random.randint(5, 35),
-                    "pm10": random.randint(10, 50),
-                    "ozone": random.randint(20, 80)
-                }
-            }
-        }
-        
-        # Cache the enhanced data
-        cache_entry = {
-            "id": str(uuid.uuid4()),
-            "location": location,
-            "weather_data": enhanced_weather,
-            "cached_date": datetime.now(),
-            "expires_at": datetime.now() + timedelta(minutes=15)  # Shorter cache for enhanced data
-        }
-        
-        await db.weather_cache.update_one(
-            {"location": location},
-            {"$set": cache_entry},
-            upsert=True
+        enhanced_weather, cached = await weather_cache.get(
+            "enhanced", location, WEATHER_ENHANCED_TTL, generate_enhanced_weather
         )
         
         return {
             "success": True,
             "location": location,
             "weather": enhanced_weather,
-            "cached": False,
+            "cached": cached,
             "data_source": "Enhanced Weather API"
         }
         
@@ -1284,30 +3691,99 @@ async def get_enhanced_weather(location: str = "New York"):
         raise HTTPException(status_code=500, detail=f"Enhanced weather service error: {str(e)}")
 
 # System Performance and Live Stats
+SYSTEM_SAMPLE_INTERVAL_SECONDS = float(os.environ.get("SYSTEM_SAMPLE_INTERVAL_SECONDS", 5))
+SYSTEM_SAMPLE_HISTORY = int(os.environ.get("SYSTEM_SAMPLE_HISTORY", 120))
+SYSTEM_CONNECTION_SAMPLE_EVERY = int(os.environ.get("SYSTEM_CONNECTION_SAMPLE_EVERY", 6))
+
+class SystemMetricsSampler:
+    """Samples host metrics on a worker thread into a fixed-size ring buffer.
+
+    cpu_percent is read non-blocking (usage since the previous sample), and
+    the expensive net_connections scan only runs every few samples.
+    """
+
+    def __init__(self, interval: float, history_size: int, connection_every: int):
+        self.interval = interval
+        self.connection_every = max(1, connection_every)
+        self.history: deque = deque(maxlen=history_size)
+        self.samples_taken = 0
+        self.active_connections: Optional[int] = None
+        self.boot_time: Optional[float] = None
+        self.loop = PeriodicTask("System metrics sample", self._record, interval, run_first=True)
+
+    def start(self):
+        if psutil is None:
+            logger.warning("psutil not installed, system metrics sampler disabled")
+            return
+        if self.loop.task is None:
+            self.boot_time = psutil.boot_time()
+            psutil.cpu_percent(interval=None)  # Prime the CPU counter
+            self.loop.start()
+
+    async def _record(self):
+        self.history.append(await asyncio.to_thread(self._sample))
+
+    def _sample(self) -> Dict[str, Any]:
+        if self.samples_taken % self.connection_every == 0:
+            try:
+                self.active_connections = len(psutil.net_connections())
+            except (psutil.AccessDenied, OSError):
+                pass
+        self.samples_taken += 1
+        
+        return {
+            "timestamp": time.time(),
+            "cpu_usage": psutil.cpu_percent(interval=None),
+            "memory_usage": psutil.virtual_memory().percent,
+            "disk_usage": psutil.disk_usage('/').percent,
+            "active_connections": self.active_connections
+        }
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self.history[-1] if self.history else None
+
+    def recent(self, seconds: float) -> List[Dict[str, Any]]:
+        cutoff = time.time() - seconds
+        return [sample for sample in self.history if sample["timestamp"] >= cutoff]
+
+    async def close(self):
+        await self.loop.close()
+
+system_sampler = SystemMetricsSampler(
+    SYSTEM_SAMPLE_INTERVAL_SECONDS, SYSTEM_SAMPLE_HISTORY, SYSTEM_CONNECTION_SAMPLE_EVERY
+)
+
 @app.get("/api/system/performance")
-async def get_system_performance():
-    """Get real-time system performance metrics"""
+async def get_system_performance(history_seconds: int = 60):
+    """Get real-time system performance metrics from the background sampler"""
     try:
-        # Real system stats
-        import psutil
+        sample = system_sampler.latest()
+        if sample is None:
+            raise RuntimeError("No system metrics sampled yet")
         
         performance_data = {
-            "cpu_usage": psutil.cpu_percent(interval=1),
-            "memory_usage": psutil.virtual_memory().percent,
-            "disk_usage": psutil.disk_usage('/').percent,
-            "active_connections": len(psutil.net_connections()),
-            "boot_time": datetime.fromtimestamp(psutil.boot_time()).isoformat(),
-            "system_uptime_hours": (time.time() - psutil.boot_time()) / 3600,
+            "cpu_usage": sample["cpu_usage"],
+            "memory_usage": sample["memory_usage"],
+            "disk_usage": sample["disk_usage"],
+            "active_connections": sample["active_connections"],
+            "boot_time": datetime.fromtimestamp(system_sampler.boot_time).isoformat(),
+            "system_uptime_hours": (time.time() - system_sampler.boot_time) / 3600,
+            "sampled_at": datetime.fromtimestamp(sample["timestamp"]).isoformat(),
             "database_status": "Connected",
-            "api_response_time": f"{random.randint(45, 120)}ms",
-            "total_requests_today": random.randint(1500, 5000),
-            "error_rate": f"{random.uniform(0.1, 2.0):.1f}%",
-            "cache_hit_ratio": f"{random.randint(85, 98)}%"
+            **telemetry.summary(),
+            "password_hashing": password_hasher.stats(),
+            "productivity_write_behind": productivity_buffer.stats(),
+            "weather_cache": weather_cache.stats(),
+            "download_engine": download_engine.stats(),
+            "download_progress": download_progress.stats(),
+            "achievements": achievement_engine.stats(),
+            "event_push": event_hub.stats()
         }
         
         return {
             "success": True,
             "performance": performance_data,
+            "history": system_sampler.recent(history_seconds),
             "timestamp": datetime.now().isoformat(),
             "status": "operational"
         }
@@ -1321,10 +3797,7 @@ async def get_system_performance():
             "active_connections": random.randint(50, 200),
             "system_uptime_hours": random.randint(24, 720),
             "database_status": "Connected",
-            "api_response_time": f"{random.randint(50, 150)}ms",
-            "total_requests_today": random.randint(1000, 3000),
-            "error_rate": f"{random.uniform(0.1, 3.0):.1f}%",
-            "cache_hit_ratio": f"{random.randint(80, 95)}%"
+            **telemetry.summary()
         }
         
         return {
@@ -1333,103 +3806,406 @@ async def get_system_performance():
             "timestamp": datetime.now().isoformat(),
             "status": "operational_fallback"
         }
+# Content-addressed file store
+UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", ROOT_DIR / "uploads"))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+USER_STORAGE_QUOTA_BYTES = int(os.environ.get("USER_STORAGE_QUOTA_BYTES", 1024 ** 3))
+
+def _write_and_hash(handle, hasher, chunk: bytes):
+    hasher.update(chunk)
+    handle.write(chunk)
+
+class ContentStore:
+    """Content-addressed blob store on local disk.
+
+    Blobs live at <root>/<sha[:2]>/<sha[2:4]>/<sha>, so identical uploads
+    share one file. Uploads are streamed chunk by chunk into a temp file
+    while being hashed on a worker thread, then moved into place.
+
+    blob_refs holds a reference count per blob. An upload takes its
+    reference before looking for an existing blob, and a blob is only
+    unlinked by whoever deletes its count document at zero.
+    """
+
+    def __init__(self, root: Path, chunk_size: int):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def relative_path(self, sha256: str) -> str:
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.root / self.relative_path(sha256)
+
+    async def save(self, upload: UploadFile, max_bytes: int) -> tuple:
+        """Stream an upload into the store, returning (sha256, size, deduplicated)"""
+        tmp_dir = self.root / "tmp"
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        handle = os.fdopen(fd, "wb")
+        hasher = hashlib.sha256()
+        size = 0
+        
+        try:
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="Storage quota exceeded")
+                await asyncio.to_thread(_write_and_hash, handle, hasher, chunk)
+            await asyncio.to_thread(handle.close)
+            
+            sha256 = hasher.hexdigest()
+        except BaseException:
+            handle.close()
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        
+        await db.blob_refs.update_one({"sha256": sha256}, {"$inc": {"refs": 1}}, upsert=True)
+        try:
+            deduplicated = await asyncio.to_thread(self._commit, tmp_path, sha256)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            await self.release(sha256)
+            raise
+        return sha256, size, deduplicated
+
+    def _commit(self, tmp_path: str, sha256: str) -> bool:
+        target = self.blob_path(sha256)
+        if target.exists():
+            os.unlink(tmp_path)
+            return True
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, target)
+        return False
+
+    async def release(self, sha256: str):
+        """Drop one reference, removing the blob once nothing references it"""
+        refs = await db.blob_refs.find_one_and_update(
+            {"sha256": sha256}, {"$inc": {"refs": -1}}, {"_id": 0, "refs": 1}, return_document=ReturnDocument.AFTER
+        )
+        if refs and refs["refs"] > 0:
+            return
+        # Blobs stored before reference counting may still have file records
+        if await db.files.count_documents({"sha256": sha256}, limit=1):
+            return
+        if refs and (await db.blob_refs.delete_one({"sha256": sha256, "refs": {"$lte": 0}})).deleted_count == 0:
+            return
+        
+        # An upload may take a reference between the delete and the unlink; move
+        # the blob aside first and put it back if a reference has appeared since
+        tombstone = self.root / "tmp" / f"{sha256}.{uuid.uuid4().hex}"
+        try:
+            await asyncio.to_thread(os.replace, self.blob_path(sha256), tombstone)
+        except FileNotFoundError:
+            return
+        if await db.blob_refs.count_documents({"sha256": sha256}, limit=1):
+            await asyncio.to_thread(os.replace, tombstone, self.blob_path(sha256))
+        else:
+            await asyncio.to_thread(tombstone.unlink, missing_ok=True)
+
+content_store = ContentStore(UPLOAD_DIR, UPLOAD_CHUNK_BYTES)
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match value against an ETag"""
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+def _etag_matches_strong(header: Optional[str], etag: str) -> bool:
+    """Strong comparison, as If-Range requires: weak tags never match"""
+    return bool(header) and not header.strip().startswith("W/") and header.strip() == etag
+
+def parse_byte_range(header: str, total: int) -> Optional[tuple]:
+    """Resolve a single-range Range header to inclusive (start, end) offsets.
+
+    Returns None when the header should be ignored (unknown unit, several
+    ranges or a malformed spec), in which case the whole entity is served.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    try:
+        if not sep:
+            raise ValueError(spec)
+        if first:
+            start = int(first)
+            end = min(int(last), total - 1) if last else total - 1
+        else:
+            length = int(last)
+            if length <= 0:
+                raise ValueError(spec)
+            start, end = max(total - length, 0), total - 1
+    except ValueError:
+        return None
+    if last and first and int(last) < start:
+        # A last-pos before first-pos makes the header invalid, not unsatisfiable
+        return None
+    if start < 0 or start >= total:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{total}"}
+        )
+    return start, end
+
+def _read_blob_slice(handle, offset: int, size: int) -> bytes:
+    handle.seek(offset)
+    return handle.read(size)
+
+class BlobFileResponse(Response):
+    """Streams a byte range of a stored blob without buffering it in memory.
+
+    Hands the file to the server through the ASGI pathsend/zerocopysend
+    extensions when offered, otherwise reads chunks on a worker thread.
+    """
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int, headers: Dict[str, str], media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        
+        extensions = scope.get("extensions") or {}
+        count = self.end - self.start + 1
+        if self.status_code == 200 and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            return
+        
+        handle = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in extensions:
+                await send({"type": "http.response.zerocopysend", "file": handle, "offset": self.start, "count": count})
+                return
+            offset, more_body = self.start, True
+            while more_body:
+                chunk = b""
+                if count > 0:
+                    chunk = await asyncio.to_thread(_read_blob_slice, handle, offset, min(UPLOAD_CHUNK_BYTES, count))
+                offset += len(chunk)
+                count -= len(chunk)
+                more_body = bool(chunk) and count > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        finally:
+            await asyncio.to_thread(handle.close)
+
+async def get_user_storage_used(user_id: str) -> int:
+    """Total bytes of uploads owned by a user"""
+    totals = await db.files.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "used": {"$sum": "$file_size"}}}
+    ]).to_list(1)
+    return totals[0]["used"] if totals else 0
+
 @app.post("/api/files/upload")
 async def upload_file(file: UploadFile = File(...), session_token: str = None):
-    """Upload a file"""
-    user_id = get_current_user(session_token)
+    """Upload a file, streaming it to the content-addressed store"""
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
-    # For demo purposes, we'll simulate file upload
-    # In production, you would save the actual file
+    # Fail fast while streaming; the total is checked again once the record exists
+    remaining = USER_STORAGE_QUOTA_BYTES - await get_user_storage_used(user_id)
+    sha256, file_size, deduplicated = await content_store.save(file, remaining)
     
     file_record = FileRecord(
         user_id=user_id,
         filename=f"{uuid.uuid4()}_{file.filename}",
         original_filename=file.filename,
-        file_size=0,  # Would be actual file size
+        file_size=file_size,
         file_type=file.content_type or "unknown",
-        file_path=f"/uploads/{user_id}/{file.filename}",
+        file_path=content_store.relative_path(sha256),
+        sha256=sha256,
         category="upload"
     )
     
-    await db.files.insert_one(file_record.dict())
+    try:
+        await db.files.insert_one(file_record.dict())
+    except BaseException:
+        await content_store.release(sha256)
+        raise
+    
+    # Concurrent uploads each passed the first check; whichever tips the total over backs out
+    if await get_user_storage_used(user_id) > USER_STORAGE_QUOTA_BYTES:
+        await db.files.delete_one({"id": file_record.id})
+        await content_store.release(sha256)
+        raise HTTPException(status_code=413, detail="Storage quota exceeded")
+    
     await log_productivity_action(user_id, "file_uploaded", 5, {"filename": file.filename})
     
     return {
         "success": True,
         "file_id": file_record.id,
+        "file_size": file_size,
+        "sha256": sha256,
+        "deduplicated": deduplicated,
         "message": f"File '{file.filename}' uploaded successfully",
         "points_earned": 5
     }
 
 @app.get("/api/files")
-async def get_files(session_token: str = None):
-    """Get all files for user"""
-    user_id = get_current_user(session_token)
+async def get_files(session_token: str = None, limit: int = LIST_PAGE_SIZE, cursor: Optional[str] = None, fields: Optional[str] = None):
+    """Get a page of files for user"""
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
-    files = await db.files.find({"user_id": user_id}).sort("upload_date", -1).to_list(100)
-    converted_files = convert_mongo_doc(files)
+    projection = build_list_projection(fields, set(FileRecord.model_fields), "upload_date")
+    files, next_cursor = await paginate_user_collection(
+        db.files, user_id, "upload_date", limit, cursor, projection
+    )
     
-    return {"files": converted_files}
+    return MongoJSONResponse({"files": files, "next_cursor": next_cursor})
 
-@app.get("/api/files/{file_id}/download")
-async def download_file(file_id: str, session_token: str = None):
-    """Download a file"""
-    user_id = get_current_user(session_token)
+@app.api_route("/api/files/{file_id}/download", methods=["GET", "HEAD"])
+async def download_file(file_id: str, request: Request, session_token: str = None):
+    """Download a file, honouring Range and If-None-Match"""
+    user_id = await get_current_user(session_token)
     
-    file_record = await db.files.find_one({"id": file_id, "user_id": user_id})
+    file_record = await db.files.find_one(
+        {"id": file_id, "user_id": user_id},
+        {"_id": 0, "sha256": 1, "file_type": 1, "original_filename": 1}
+    )
     
     if not file_record:
         raise HTTPException(status_code=404, detail="File not found")
+    if not file_record.get("sha256"):
+        raise HTTPException(status_code=404, detail="File content not available")
     
-    # For demo purposes, return file info
-    # In production, you would return the actual file stream
-    return {
-        "success": True,
-        "file_info": convert_mongo_doc(file_record),
-        "download_url": f"/download/{file_id}",
-        "message": "File ready for download"
-    }
+    path = content_store.blob_path(file_record["sha256"])
+    try:
+        total = (await asyncio.to_thread(path.stat)).st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File content not available")
+    
+    etag = f'"{file_record["sha256"]}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=0"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    start, end, status_code = 0, total - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and total > 0 and (if_range is None or _etag_matches_strong(if_range, etag)):
+        byte_range = parse_byte_range(range_header, total)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    
+    filename = file_record.get("original_filename") or file_id
+    headers["Content-Disposition"] = f"attachment; filename*=utf-8''{urllib.parse.quote(filename)}"
+    media_type = file_record.get("file_type")
+    if not media_type or media_type == "unknown":
+        media_type = "application/octet-stream"
+    
+    return BlobFileResponse(path, start, end, status_code, headers, media_type)
 
 @app.delete("/api/files/{file_id}")
 async def delete_file(file_id: str, session_token: str = None):
     """Delete a file"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     
-    result = await db.files.delete_one({"id": file_id, "user_id": user_id})
+    file_record = await db.files.find_one_and_delete({"id": file_id, "user_id": user_id}, {"_id": 0, "sha256": 1})
     
-    if result.deleted_count == 0:
+    if not file_record:
         raise HTTPException(status_code=404, detail="File not found")
     
+    if file_record.get("sha256"):
+        await content_store.release(file_record["sha256"])
+    
     return {"success": True, "message": "File deleted successfully"}
+# Authentication API Endpoints
+@app.post("/api/auth/register")
+async def register_user(request: RegisterRequest):
+    """Register a new user account"""
+    existing = await db.users.find_one({"username": request.username}, {"_id": 0, "id": 1})
+    if existing:
+        raise HTTPException(status_code=409, detail="Username already taken")
+    
+    user = User(
+        username=request.username,
+        email=request.email,
+        password_hash=await password_hasher.hash(request.password),
+        registered=True
+    )
+    
+    try:
+        await db.users.insert_one(user.dict())
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration for the same username
+        raise HTTPException(status_code=409, detail="Username already taken")
+    await initialize_achievements(user.id)
+    
+    return {
+        "success": True,
+        "user_id": user.id,
+        "session_token": await create_session(user.id),
+        "message": f"Welcome to ThriveRemoteOS, {request.username}!"
+    }
+
+@app.post("/api/auth/login")
+async def login_user(request: LoginRequest):
+    """Log in and transparently upgrade outdated password hashes"""
+    # Demo users are never registered, which also shuts out older ones hashed from a shared default
+    user = await db.users.find_one(
+        {"username": request.username, "registered": True}, {"_id": 0, "id": 1, "password_hash": 1}
+    )
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    
+    valid, new_hash = await password_hasher.verify_and_rehash(request.password, user.get("password_hash", ""))
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    
+    if new_hash:
+        # Only swap the hash if nobody changed it while we were verifying
+        await db.users.update_one(
+            {"id": user["id"], "password_hash": user["password_hash"]},
+            {"$set": {"password_hash": new_hash}}
+        )
+        user_cache.invalidate(user["id"])
+    
+    return {
+        "success": True,
+        "user_id": user["id"],
+        "session_token": await create_session(user["id"])
+    }
+
+@app.post("/api/auth/logout")
+async def logout_user(session_token: str = None):
+    """End the current session"""
+    if session_token:
+        await session_store.delete(session_token)
+    
+    return {"success": True, "message": "Logged out"}
+
 @app.get("/api/user/current")
 async def get_current_user_info(session_token: str = None):
     """Get current user information (demo mode)"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     user = await get_or_create_user(user_id)
     
-    # Convert MongoDB document to JSON serializable format
-    safe_user = convert_mongo_doc(user)
-    
     # Remove sensitive data
-    if 'password_hash' in safe_user:
-        del safe_user['password_hash']
+    safe_user = {key: value for key, value in user.items() if key not in ("_id", "password_hash")}
     
-    return safe_user
+    return MongoJSONResponse(safe_user)
 
 @app.get("/api/jobs/live")
 async def get_live_jobs():
     """Get real live job listings from multiple sources"""
     
-    # Check if we need to refresh jobs
-    jobs_count = await db.jobs.count_documents({})
-    
-    if jobs_count < 10:  # Refresh if we have fewer than 10 jobs
-        await job_service.refresh_jobs()
-    
-    # Get jobs from database
-    jobs = await db.jobs.find().sort("posted_date", -1).limit(50).to_list(50)
+    # Served from the background-refreshed snapshot
+    jobs = await job_scheduler.get_jobs()
     
     # Add curated remote jobs
     curated_jobs = [
@@ -1462,7 +4238,17 @@ async def get_live_jobs():
     # Combine real jobs with curated ones
     all_jobs = jobs + curated_jobs
     
-    return {"jobs": all_jobs, "total": len(all_jobs), "source": "live_multi_source_mongodb"}
+    return MongoJSONResponse({
+        "jobs": all_jobs,
+        "total": len(all_jobs),
+        "source": "live_multi_source_mongodb",
+        "upstream": job_service.stats()
+    })
+
+@app.get("/api/metrics")
+async def get_prometheus_metrics():
+    """Expose request telemetry in the Prometheus text format"""
+    return Response(content=telemetry.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/api/dashboard/live-stats")
 async def get_live_dashboard_stats():
@@ -1470,46 +4256,170 @@ async def get_live_dashboard_stats():
     
     # Real network statistics with database counts
     jobs_count = await db.jobs.count_documents({})
-    users_count = await db.users.count_documents({})
+    users_active_today = await db.users.count_documents({"last_streak_date": datetime.now().date().isoformat()})
+    
+    sample = system_sampler.latest()
+    connections = sample["active_connections"] if sample and sample["active_connections"] is not None else telemetry.in_flight
     
     network_stats = {
-        "arizona_connections": 127 + int(time.time() % 50),
-        "peak_district_nodes": 89 + int(time.time() % 30), 
-        "remote_opportunities": jobs_count + 1200,
+        "arizona_connections": connections,
+        "peak_district_nodes": len(telemetry.route_latency),
+        "remote_opportunities": jobs_count,
         "classified_servers": 15,
-        "active_users": users_count + int(time.time() % 100),
-        "data_processed": f"{(time.time() % 1000):.1f} GB",
-        "uptime_hours": int(time.time() / 3600) % 10000,
+        "active_users": users_active_today,
+        "data_processed": f"{telemetry.bytes_sent / 1024 ** 3:.3f} GB",
+        "uptime_hours": int((time.time() - telemetry.started) / 3600),
         "security_level": "MAXIMUM",
-        "threat_level": "GREEN" if time.time() % 3 > 1 else "YELLOW",
+        "threat_level": "GREEN" if telemetry.error_rate() < 0.01 else "YELLOW",
         "database": "MongoDB Connected"
     }
     
     return network_stats
 
+# Live stats push
+LIVE_STATS_INTERVAL_SECONDS = float(os.environ.get("LIVE_STATS_INTERVAL_SECONDS", 2))
+
+class LiveStatsPublisher:
+    """Publishes system and dashboard stats to the hub while anyone listens.
+
+    One producer replaces every client polling /api/system/performance and
+    /api/dashboard/live-stats; the latest snapshot is retained so a new
+    subscriber gets it immediately.
+    """
+
+    def __init__(self, hub: EventHub, interval: float):
+        self.hub = hub
+        self.interval = interval
+        self.loop = PeriodicTask("Live stats publish", self.publish, interval, run_first=True)
+
+    def start(self):
+        self.loop.start()
+
+    async def publish(self):
+        if not self.hub.subscriber_count("system"):
+            return
+        performance = await get_system_performance(history_seconds=0)
+        dashboard = await get_live_dashboard_stats()
+        self.hub.publish("system", "stats", {
+            "performance": performance["performance"],
+            "dashboard": dashboard,
+            "timestamp": datetime.now().isoformat()
+        }, retain=True)
+
+    async def close(self):
+        await self.loop.close()
+
+live_stats_publisher = LiveStatsPublisher(event_hub, LIVE_STATS_INTERVAL_SECONDS)
+
+@app.get("/api/stream/system")
+async def stream_system_stats(request: Request):
+    """Push system performance and live dashboard stats as server-sent events"""
+    return event_hub.response("system", request)
+
+# Per-user dashboard counters
+USER_COUNTERS_STALE_HOURS = float(os.environ.get("USER_COUNTERS_STALE_HOURS", 24))
+USER_COUNTERS_RECONCILE_SECONDS = float(os.environ.get("USER_COUNTERS_RECONCILE_SECONDS", 3600))
+USER_COUNTERS_RECONCILE_BATCH = 100
+USER_COUNTER_FIELDS = ("applications", "tasks", "tasks_completed", "achievements_unlocked")
+
+def _counted(collection: str, user_id: str, kind: str, match: Dict = {}) -> Dict:
+    return {"$unionWith": {"coll": collection, "pipeline": [
+        {"$match": {"user_id": user_id, **match}},
+        {"$project": {"_id": 0, "kind": {"$literal": kind}}}
+    ]}}
+
+async def bump_user_counters(user_id: str, **deltas) -> Dict:
+    """Apply $inc deltas to a user's counters document and feed the new values to achievement rules.
+    
+    Callers write the source document first, so when the upsert has just
+    created a partial document a rebuild already includes the delta.
+    """
+    counters = await db.user_counters.find_one_and_update(
+        {"user_id": user_id}, {"$inc": deltas}, {"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    if counters.get("rebuilt_at") is None:
+        return await rebuild_user_counters(user_id)
+    achievement_engine.observe(user_id, {field: counters.get(field) for field in deltas})
+    return counters
+
+async def rebuild_user_counters(user_id: str) -> Dict:
+    """Recount a user's counters from source collections in one aggregation"""
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$project": {"_id": 0, "kind": {"$literal": "task"}, "status": 1}},
+        _counted("applications", user_id, "application"),
+        _counted("relocate_applications", user_id, "application"),
+        _counted("achievements", user_id, "achievement", {"unlocked": True}),
+        {"$facet": {
+            "applications": [{"$match": {"kind": "application"}}, {"$count": "n"}],
+            "tasks": [{"$match": {"kind": "task"}}, {"$count": "n"}],
+            "tasks_completed": [{"$match": {"kind": "task", "status": "completed"}}, {"$count": "n"}],
+            "achievements_unlocked": [{"$match": {"kind": "achievement"}}, {"$count": "n"}]
+        }}
+    ]
+    facets = (await db.tasks.aggregate(pipeline).to_list(1))[0]
+    
+    counters = {field: facets[field][0]["n"] if facets[field] else 0 for field in USER_COUNTER_FIELDS}
+    counters.update(user_id=user_id, rebuilt_at=datetime.now())
+    await db.user_counters.replace_one({"user_id": user_id}, counters, upsert=True)
+    achievement_engine.observe(user_id, counters)
+    return counters
+
+async def get_user_counters(user_id: str) -> Dict:
+    """Read a user's counters, rebuilding them if missing or stale"""
+    counters = await db.user_counters.find_one({"user_id": user_id}, {"_id": 0})
+    stale_before = datetime.now() - timedelta(hours=USER_COUNTERS_STALE_HOURS)
+    if not counters or counters.get("rebuilt_at") is None or counters["rebuilt_at"] < stale_before:
+        counters = await rebuild_user_counters(user_id)
+    return counters
+
+class UserCounterReconciler:
+    """Periodically rebuilds the stalest counters documents to correct drift"""
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.loop = PeriodicTask("User counter reconcile", self.reconcile, interval)
+        self.rebuilt = 0
+
+    def start(self):
+        self.loop.start()
+
+    async def reconcile(self):
+        stale_before = datetime.now() - timedelta(hours=USER_COUNTERS_STALE_HOURS)
+        stale = await db.user_counters.find(
+            {"$or": [{"rebuilt_at": {"$lt": stale_before}}, {"rebuilt_at": None}]}, {"_id": 0, "user_id": 1}
+        ).limit(self.batch_size).to_list(self.batch_size)
+        for counters in stale:
+            await rebuild_user_counters(counters["user_id"])
+            self.rebuilt += 1
+
+    async def close(self):
+        await self.loop.close()
+
+user_counter_reconciler = UserCounterReconciler(USER_COUNTERS_RECONCILE_SECONDS, USER_COUNTERS_RECONCILE_BATCH)
+
 @app.get("/api/dashboard/stats")
 async def get_dashboard_stats(session_token: str = None):
     """Get real user dashboard statistics"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     user = await get_or_create_user(user_id)
     
-    # Get real counts from database
-    total_applications = await db.applications.count_documents({"user_id": user_id})
-    total_tasks = await db.tasks.count_documents({"user_id": user_id})
-    completed_tasks = await db.tasks.count_documents({"user_id": user_id, "status": "completed"})
-    unlocked_achievements = await db.achievements.count_documents({"user_id": user_id, "unlocked": True})
+    # Counts are maintained incrementally in one document per user
+    counters = await get_user_counters(user_id)
+    total_applications = counters["applications"]
+    total_tasks = counters["tasks"]
+    completed_tasks = counters["tasks_completed"]
+    unlocked_achievements = counters["achievements_unlocked"]
     
     # Calculate savings progress
-    current_savings = user.get("current_savings", 0.0)
     savings_goal = user.get("savings_goal", 5000.0)
-    streak_bonus = user.get("daily_streak", 1) * 25
-    total_savings = current_savings + streak_bonus
-    savings_progress = min((total_savings / savings_goal) * 100, 100)
+    total_savings = user.get("current_savings", 0.0) + user.get("daily_streak", 1) * 25
     
     return {
         "total_applications": total_applications,
         "interviews_scheduled": 0,
-        "savings_progress": savings_progress,
+        "savings_progress": savings_progress(user),
         "tasks_completed_today": completed_tasks,
         "active_jobs_watching": total_tasks,
         "monthly_savings": total_savings,
@@ -1525,116 +4435,98 @@ async def get_dashboard_stats(session_token: str = None):
         "database_type": "MongoDB"
     }
 
+# Productivity history
+PRODUCTIVITY_HISTORY_MAX_BUCKETS = 1000
+PRODUCTIVITY_BUCKET_STEP = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+PRODUCTIVITY_HISTORY_DEFAULT_BUCKETS = {"minute": 60, "hour": 24, "day": 30}
+
+def _local_naive(value: datetime) -> datetime:
+    # Timestamps are stored as naive local time
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+
+@app.get("/api/productivity/history")
+async def get_productivity_history(granularity: str = "hour", start: Optional[datetime] = None,
+                                   end: Optional[datetime] = None, session_token: str = None):
+    """Points and actions per minute, hour or day between start and end, from the rollups"""
+    user_id = await get_current_user(session_token)
+    
+    step = PRODUCTIVITY_BUCKET_STEP.get(granularity)
+    if step is None:
+        raise HTTPException(status_code=400, detail="granularity must be minute, hour or day")
+    end = rollup_bucket(_local_naive(end) if end else datetime.now(), granularity)
+    if start:
+        start = rollup_bucket(_local_naive(start), granularity)
+    else:
+        start = end - step * (PRODUCTIVITY_HISTORY_DEFAULT_BUCKETS[granularity] - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start) / step >= PRODUCTIVITY_HISTORY_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCTIVITY_HISTORY_MAX_BUCKETS} buckets per request")
+    
+    rollups = await db.productivity_rollups.find(
+        {"user_id": user_id, "granularity": granularity, "bucket": {"$gte": start, "$lte": end}},
+        {"_id": 0, "bucket": 1, "points": 1, "actions": 1, "by_action": 1}
+    ).to_list(None)
+    by_bucket = {rollup["bucket"]: rollup for rollup in rollups}
+    
+    buckets = []
+    bucket = start
+    while bucket <= end:
+        rollup = by_bucket.get(bucket, {})
+        buckets.append({
+            "bucket": bucket,
+            "points": rollup.get("points", 0),
+            "actions": rollup.get("actions", 0),
+            "by_action": rollup.get("by_action", {})
+        })
+        bucket += step
+    
+    return MongoJSONResponse({
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "buckets": buckets,
+        "total_points": sum(item["points"] for item in buckets),
+        "total_actions": sum(item["actions"] for item in buckets)
+    })
+
 # AI Tools and Content Management
 @app.get("/api/content/ai-tools")
-async def get_ai_tools():
+async def get_ai_tools(request: Request):
     """Get comprehensive AI tools for job applications"""
-    ai_tools = {
-        "categories": {
-            "ai_automation": {
-                "name": "AI Automation",
-                "count": 10,
-                "tools": [
-                    {"name": "AI Apply", "description": "Premium automation platform", "url": "https://aiapply.co/"},
-                    {"name": "LazyApply", "description": "LinkedIn/Indeed automation", "url": "https://lazyapply.com/"},
-                    {"name": "Job Application Bot", "description": "Chrome extension", "url": "https://jobsbot.com/"},
-                    {"name": "Simplify Jobs", "description": "One-click applications", "url": "https://simplify.jobs/"},
-                    {"name": "Jobscan Automation", "description": "Resume optimization + tracking", "url": "https://jobscan.co/"}
-                ]
-            },
-            "resume_builders": {
-                "name": "Resume Builders", 
-                "count": 10,
-                "tools": [
-                    {"name": "Teal HQ", "description": "Premium builder with job matching", "url": "https://tealhq.com/"},
-                    {"name": "Resume Worded", "description": "AI scoring system", "url": "https://resumeworded.com/"},
-                    {"name": "Rezi", "description": "ATS-optimized builder", "url": "https://rezi.ai/"},
-                    {"name": "Enhancv", "description": "Visual customization", "url": "https://enhancv.com/"},
-                    {"name": "Kickresume", "description": "Professional templates", "url": "https://kickresume.com/"}
-                ]
-            },
-            "interview_prep": {
-                "name": "Interview Preparation",
-                "count": 10,
-                "tools": [
-                    {"name": "Interview Warmup (Google)", "description": "Google's AI platform", "url": "https://grow.google/certificates/interview-warmup/"},
-                    {"name": "Interviewing.io", "description": "Technical interviews", "url": "https://interviewing.io/"},
-                    {"name": "Pramp", "description": "Peer-to-peer practice", "url": "https://pramp.com/"},
-                    {"name": "Big Interview", "description": "Training system", "url": "https://biginterview.com/"},
-                    {"name": "InterviewBuddy", "description": "AI coach", "url": "https://interviewbuddy.in/"}
-                ]
-            },
-            "job_search": {
-                "name": "Job Search Platforms",
-                "count": 10,
-                "tools": [
-                    {"name": "LinkedIn Jobs AI", "description": "Professional platform", "url": "https://linkedin.com/jobs/"},
-                    {"name": "ZipRecruiter AI", "description": "Job matching", "url": "https://ziprecruiter.com/"},
-                    {"name": "Indeed Smart Apply", "description": "Smart applications", "url": "https://indeed.com/"},
-                    {"name": "Glassdoor AI", "description": "Company insights", "url": "https://glassdoor.com/"},
-                    {"name": "AngelList Talent", "description": "Startup matching", "url": "https://angel.co/"}
-                ]
-            }
-        },
-        "total_tools": 120,
-        "total_categories": 12,
-        "featured_tools": ["AI Apply", "Resume Worded", "Interview Warmup", "LinkedIn Jobs AI"]
-    }
-    
-    return ai_tools
+    return static_content.respond("ai_tools", request)
 
 # Achievement System
 @app.get("/api/achievements")
 async def get_achievements(session_token: str = None):
     """Get user's achievements"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
-    achievements = await db.achievements.find({"user_id": user_id}).sort([("unlocked", -1), ("_id", 1)]).to_list(100)
-    
-    # Convert MongoDB documents to JSON serializable format
-    converted_achievements = convert_mongo_doc(achievements)
-    
-    return {"achievements": converted_achievements}
-
-async def unlock_achievement(user_id: str, achievement_id: str):
-    """Unlock an achievement for user"""
-    result = await db.achievements.update_one(
-        {"user_id": user_id, "id": achievement_id, "unlocked": False},
-        {"$set": {"unlocked": True, "unlock_date": datetime.now()}}
-    )
-    
-    if result.modified_count > 0:
-        # Update user achievement count
-        await db.users.update_one(
-            {"id": user_id},
-            {"$inc": {"achievements_unlocked": 1}}
-        )
-        
-        # Award bonus points
-        await log_productivity_action(user_id, "achievement_unlocked", 50, {"achievement_id": achievement_id})
-        return True
+    achievements = await db.achievements.find({"user_id": user_id}, {"_id": 0}).sort([("unlocked", -1), ("_id", 1)]).to_list(100)
     
-    return False
+    return MongoJSONResponse({"achievements": achievements})
 
 # Tasks Management
 @app.get("/api/tasks")
-async def get_tasks(session_token: str = None):
-    """Get user's tasks"""
-    user_id = get_current_user(session_token) 
+async def get_tasks(session_token: str = None, limit: int = LIST_PAGE_SIZE, cursor: Optional[str] = None, fields: Optional[str] = None):
+    """Get a page of user's tasks"""
+    user_id = await get_current_user(session_token) 
     await get_or_create_user(user_id)
     
-    tasks = await db.tasks.find({"user_id": user_id}).sort("created_date", -1).to_list(100)
+    projection = build_list_projection(fields, set(Task.model_fields), "created_date")
+    tasks, next_cursor = await paginate_user_collection(
+        db.tasks, user_id, "created_date", limit, cursor, projection
+    )
     
     # If no tasks, create some defaults
-    if not tasks:
+    if not tasks and not cursor:
         await create_default_tasks(user_id)
-        tasks = await db.tasks.find({"user_id": user_id}).sort("created_date", -1).to_list(100)
-    
-    # Convert MongoDB documents to JSON serializable format
-    converted_tasks = convert_mongo_doc(tasks)
+        tasks, next_cursor = await paginate_user_collection(
+            db.tasks, user_id, "created_date", limit, cursor, projection
+        )
     
-    return {"tasks": converted_tasks}
+    return MongoJSONResponse({"tasks": tasks, "next_cursor": next_cursor})
 
 async def create_default_tasks(user_id: str):
     """Create default tasks for new user"""
@@ -1673,11 +4565,12 @@ async def create_default_tasks(user_id: str):
     ]
     
     await db.tasks.insert_many(default_tasks)
+    await bump_user_counters(user_id, tasks=len(default_tasks))
 
 @app.post("/api/tasks")
 async def create_task(task_data: dict, session_token: str = None):
     """Create a new task"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
     task_id = str(uuid.uuid4())
@@ -1694,6 +4587,7 @@ async def create_task(task_data: dict, session_token: str = None):
     }
     
     await db.tasks.insert_one(task)
+    await bump_user_counters(user_id, tasks=1)
     await log_productivity_action(user_id, "task_created", 5, {"task_title": task["title"]})
     
     return {"message": "Task created! 📋", "task_id": task_id, "points_earned": 5}
@@ -1701,7 +4595,7 @@ async def create_task(task_data: dict, session_token: str = None):
 @app.put("/api/tasks/{task_id}/complete")
 async def complete_task(task_id: str, session_token: str = None):
     """Mark task as completed"""
-    user_id = get_current_user(session_token)
+    user_id = await get_current_user(session_token)
     await get_or_create_user(user_id)
     
     # Check if task exists and belongs to user
@@ -1710,20 +4604,16 @@ async def complete_task(task_id: str, session_token: str = None):
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    # Update task
-    await db.tasks.update_one(
-        {"id": task_id, "user_id": user_id},
+    # Update task; only the first completion moves the counter
+    result = await db.tasks.update_one(
+        {"id": task_id, "user_id": user_id, "status": {"$ne": "completed"}},
         {"$set": {"status": "completed", "completed_date": datetime.now()}}
     )
+    counters = await bump_user_counters(user_id, tasks_completed=result.modified_count)
     
-    # Award points
+    # Award points; achievements are evaluated from the counters by the rules engine
     await log_productivity_action(user_id, "task_completed", 20, {"task_title": task["title"]})
-    
-    # Check achievements
-    completed_count = await db.tasks.count_documents({"user_id": user_id, "status": "completed"})
-    
-    if completed_count >= 10:
-        await unlock_achievement(user_id, "task_master")
+    completed_count = counters["tasks_completed"]
     
     return {
         "message": "Task completed! Great work! ✅",
@@ -1731,6 +4621,32 @@ async def complete_task(task_id: str, session_token: str = None):
         "total_completed": completed_count
     }
 
+@app.on_event("startup")
+async def startup_services():
+    static_content.warm()
+    await provision_indexes()
+    await backfill_document_search_terms()
+    productivity_buffer.start()
+    achievement_engine.start()
+    productivity_compactor.start()
+    job_scheduler.start()
+    system_sampler.start()
+    download_progress.start()
+    live_stats_publisher.start()
+    user_counter_reconciler.start()
+    await download_engine.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await live_stats_publisher.close()
+    await user_counter_reconciler.close()
+    await system_sampler.close()
+    await download_engine.close()
+    await download_progress.close()
+    await job_scheduler.close()
+    await job_service.close()
+    await productivity_compactor.close()
+    await achievement_engine.close()
+    await productivity_buffer.close()
+    password_hasher.shutdown()
     client.close()
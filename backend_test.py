@@ -2,7 +2,13 @@ import requests
 import unittest
 import sys
 import json
+import time
+import asyncio
+import tempfile
+import threading
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
 
 class ThriveRemoteOSAPITester(unittest.TestCase):
     def __init__(self, *args, **kwargs):
@@ -156,8 +162,8 @@ class ThriveRemoteOSAPITester(unittest.TestCase):
         """Test the downloads API endpoints"""
         # 1. Start a new download
         download_data = {
-            "url": "https://example.com/sample.pdf",
-            "filename": "test_document.pdf",
+            "url": "https://example.com/",
+            "filename": "example.html",
             "category": "documents"
         }
         
@@ -178,42 +184,33 @@ class ThriveRemoteOSAPITester(unittest.TestCase):
         downloads = data.get("downloads", [])
         self.assertGreater(len(downloads), 0)
         
-        # 3. Update download progress
-        progress_data = {
-            "progress": 50.0,
-            "status": "downloading"
-        }
-        response = requests.put(f"{self.base_url}/downloads/{download_id}/progress", json=progress_data)
-        self.assertEqual(response.status_code, 200)
-        data = response.json()
-        self.assertTrue(data.get("success"))
+        # 3. Wait for the download engine to finish fetching
+        deadline = time.time() + 30
+        while True:
+            response = requests.get(f"{self.base_url}/downloads/{download_id}/status")
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertIn("download", data)
+            download = data.get("download", {})
+            self.assertEqual(download.get("id"), download_id)
+            self.assertIn(download.get("status"), ["pending", "downloading", "completed"], download.get("error"))
+            if download.get("status") == "completed" or time.time() > deadline:
+                break
+            time.sleep(0.5)
+        
+        # 4. Verify completion
+        self.assertEqual(download.get("status"), "completed")
+        self.assertEqual(download.get("progress"), 100.0)
+        self.assertGreater(download.get("size"), 0)
+        self.assertIn("completed_date", download)
         
-        # 4. Get download status
-        response = requests.get(f"{self.base_url}/downloads/{download_id}/status")
-        self.assertEqual(response.status_code, 200)
-        data = response.json()
-        self.assertIn("download", data)
-        download = data.get("download", {})
-        self.assertEqual(download.get("id"), download_id)
-        self.assertEqual(download.get("progress"), 50.0)
-        self.assertEqual(download.get("status"), "downloading")
-        
-        # 5. Complete download
-        progress_data = {
-            "progress": 100.0,
-            "status": "completed"
-        }
-        response = requests.put(f"{self.base_url}/downloads/{download_id}/progress", json=progress_data)
-        self.assertEqual(response.status_code, 200)
+        # 5. Internal addresses are refused
+        response = requests.post(f"{self.base_url}/downloads/start", json={"url": "http://169.254.169.254/latest/meta-data/"})
+        self.assertEqual(response.status_code, 400)
         
-        # 6. Verify completion
-        response = requests.get(f"{self.base_url}/downloads/{download_id}/status")
+        # 6. Delete the download
+        response = requests.delete(f"{self.base_url}/downloads/{download_id}")
         self.assertEqual(response.status_code, 200)
-        data = response.json()
-        download = data.get("download", {})
-        self.assertEqual(download.get("progress"), 100.0)
-        self.assertEqual(download.get("status"), "completed")
-        self.assertIn("completed_date", download)
         
         print(f"Download workflow tested successfully")
 
@@ -406,6 +403,196 @@ class ThriveRemoteOSAPITester(unittest.TestCase):
         print("Backend is operational for window positioning tests")
         print("Window positioning will be tested via frontend Playwright tests")
 
+    def test_auth_register_login(self):
+        """Test account registration and login with hashed passwords"""
+        username = f"test_user_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        credentials = {"username": username, "password": "s3cret-pass"}
+        
+        response = requests.post(f"{self.base_url}/auth/register", json=credentials)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data.get("success"))
+        self.assertIn("session_token", data)
+        
+        # Duplicate usernames are rejected
+        response = requests.post(f"{self.base_url}/auth/register", json=credentials)
+        self.assertEqual(response.status_code, 409)
+        
+        response = requests.post(f"{self.base_url}/auth/login", json=credentials)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json().get("user_id"), data.get("user_id"))
+        
+        response = requests.post(f"{self.base_url}/auth/login", json={"username": username, "password": "wrong"})
+        self.assertEqual(response.status_code, 401)
+        
+        print(f"Registered and logged in as {username}")
+
+    def test_prometheus_metrics(self):
+        """Test the Prometheus metrics endpoint reports real request telemetry"""
+        requests.get(f"{self.base_url}/")
+        response = requests.get(f"{self.base_url}/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/plain", response.headers.get("content-type", ""))
+        
+        body = response.text
+        self.assertIn("thrive_http_requests_total", body)
+        self.assertIn("thrive_http_request_duration_seconds_bucket", body)
+        self.assertIn('route="/api/"', body)
+        
+        print(f"Metrics endpoint returned {len(body.splitlines())} lines")
+
+    def test_static_catalog_etag(self):
+        """Test static catalogs answer conditional requests with 304"""
+        response = requests.get(f"{self.base_url}/music/playlist")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers.get("ETag")
+        self.assertIsNotNone(etag)
+        
+        response = requests.get(f"{self.base_url}/music/playlist", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        
+        print(f"Playlist ETag: {etag}")
+    
+    def test_document_search(self):
+        """Test document search by prefix and tag"""
+        response = requests.post(f"{self.base_url}/documents", json={
+            "title": "Relocation checklist",
+            "content": "Book flights and register with the consulate.",
+            "tags": ["relocation"]
+        })
+        self.assertEqual(response.status_code, 200)
+        document_id = response.json()["document_id"]
+        
+        response = requests.get(f"{self.base_url}/documents/search", params={"q": "consul", "tags": "relocation"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        match = next((doc for doc in data["documents"] if doc["id"] == document_id), None)
+        self.assertIsNotNone(match)
+        self.assertIn("consulate", match["snippet"])
+        self.assertNotIn("content", match)
+        self.assertTrue(match["highlights"]["snippet"])
+        
+        requests.delete(f"{self.base_url}/documents/{document_id}")
+        print(f"Search returned {len(data['documents'])} documents")
+
+class RangeFixtureHandler(BaseHTTPRequestHandler):
+    """Serves the fixture payload with Range support"""
+
+    def do_GET(self):
+        payload = self.server.payload
+        start = 0
+        range_header = self.headers.get("Range")
+        self.server.ranges.append(range_header)
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.end_headers()
+        
+        body = payload[start:]
+        if self.server.drop_after is not None:
+            # Send part of the body, then hang up once
+            cut, self.server.drop_after = self.server.drop_after, None
+            self.wfile.write(body[:cut])
+            self.close_connection = True
+            return
+        for offset in range(0, len(body), 64 * 1024):
+            self.wfile.write(body[offset:offset + 64 * 1024])
+            time.sleep(self.server.chunk_delay)
+
+    def log_message(self, *args):
+        pass
+
+class DownloadEngineFixtureTest(unittest.IsolatedAsyncioTestCase):
+    """Runs the download engine against a local HTTP fixture server"""
+
+    @classmethod
+    def setUpClass(cls):
+        sys.path.insert(0, str(Path(__file__).parent / "backend"))
+        import server
+        cls.server = server
+        
+        cls.fixture = ThreadingHTTPServer(("127.0.0.1", 0), RangeFixtureHandler)
+        cls.fixture.payload = bytes(range(256)) * 4096
+        threading.Thread(target=cls.fixture.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.fixture.server_address[1]}/fixture.bin"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fixture.shutdown()
+
+    async def asyncSetUp(self):
+        server = self.server
+        self.fixture.ranges, self.fixture.drop_after, self.fixture.chunk_delay = [], None, 0
+        server.DOWNLOAD_RETRY_BASE_SECONDS = 0.01
+        # Motor clients are tied to the loop they were first used on
+        self.client = server.AsyncIOMotorClient(server.mongo_url)
+        self.saved_db, server.db = server.db, self.client[server.db.name]
+        
+        self.directory = Path(tempfile.mkdtemp())
+        # The fixture listens on loopback, so use a plain transport instead of the public-address guard
+        import httpx
+        self.engine = server.DownloadEngine(self.directory, 2, 2, transport=httpx.AsyncHTTPTransport())
+        await self.engine.start()
+        
+        self.download = server.Download(user_id=f"engine_fixture_{time.time_ns()}", filename="fixture.bin", url=self.url).dict()
+        await server.db.downloads.insert_one(dict(self.download))
+
+    async def asyncTearDown(self):
+        await self.engine.close()
+        await self.server.db.downloads.delete_many({"user_id": self.download["user_id"]})
+        self.server.db = self.saved_db
+        self.client.close()
+
+    async def record(self):
+        return await self.server.db.downloads.find_one({"id": self.download["id"]}, {"_id": 0})
+
+    async def test_resumes_after_dropped_connection(self):
+        """A connection dropped mid-body is resumed with a Range request"""
+        self.fixture.drop_after = 300 * 1024
+        self.engine.submit(self.download)
+        await asyncio.wait_for(self.engine.queue.join(), 30)
+        
+        record = await self.record()
+        self.assertEqual(record["status"], "completed")
+        self.assertEqual(record["size"], len(self.fixture.payload))
+        self.assertEqual((self.directory / record["download_path"]).read_bytes(), self.fixture.payload)
+        self.assertEqual(self.fixture.ranges[0], None)
+        self.assertTrue(self.fixture.ranges[-1].startswith("bytes="))
+        self.assertGreaterEqual(self.engine.retries, 1)
+
+    async def test_close_keeps_partial_file(self):
+        """Shutting down leaves in-flight downloads resumable"""
+        self.fixture.chunk_delay = 0.05
+        self.engine.submit(self.download)
+        part = self.engine.part_path(self.download)
+        for _ in range(100):
+            if part.exists() and part.stat().st_size:
+                break
+            await asyncio.sleep(0.05)
+        
+        await asyncio.wait_for(self.engine.close(), 5)
+        self.assertTrue(part.exists())
+        self.assertIn((await self.record())["status"], ["pending", "downloading"])
+
+    async def test_cancel_discards_partial_file(self):
+        """Cancelling a running download removes its partial file"""
+        self.fixture.chunk_delay = 0.05
+        self.engine.submit(self.download)
+        part = self.engine.part_path(self.download)
+        for _ in range(100):
+            if part.exists():
+                break
+            await asyncio.sleep(0.05)
+        
+        self.engine.cancel(self.download["id"])
+        await asyncio.wait_for(self.engine.queue.join(), 5)
+        self.assertFalse(part.exists())
+        self.assertFalse(self.engine.cancelled)
+
 def run_tests():
     # Create a test suite
     suite = unittest.TestSuite()
@@ -427,6 +614,13 @@ def run_tests():
     suite.addTest(ThriveRemoteOSAPITester('test_virtual_pets'))
     suite.addTest(ThriveRemoteOSAPITester('test_user_settings'))
     suite.addTest(ThriveRemoteOSAPITester('test_window_positioning'))
+    suite.addTest(ThriveRemoteOSAPITester('test_auth_register_login'))
+    suite.addTest(ThriveRemoteOSAPITester('test_prometheus_metrics'))
+    suite.addTest(ThriveRemoteOSAPITester('test_static_catalog_etag'))
+    suite.addTest(ThriveRemoteOSAPITester('test_document_search'))
+    suite.addTest(DownloadEngineFixtureTest('test_resumes_after_dropped_connection'))
+    suite.addTest(DownloadEngineFixtureTest('test_close_keeps_partial_file'))
+    suite.addTest(DownloadEngineFixtureTest('test_cancel_discards_partial_file'))
     
     # Create a test runner
     runner = unittest.TextTestRunner(verbosity=2)
@@ -12,6 +12,9 @@ const DownloadManager = () => {
 
   useEffect(() => {
     fetchDownloads();
+    // Downloads run on the server; poll for their progress
+    const interval = setInterval(fetchDownloads, 2000);
+    return () => clearInterval(interval);
   }, []);
 
   const fetchDownloads = async () => {
@@ -34,31 +37,12 @@ const DownloadManager = () => {
         setNewDownload({ url: '', filename: '', category: 'general' });
         setShowAddForm(false);
         fetchDownloads();
-        
-        // Simulate download progress
-        simulateDownloadProgress(response.data.download_id);
       }
     } catch (error) {
       console.error('Error starting download:', error);
     }
   };
 
-  const simulateDownloadProgress = async (downloadId) => {
-    for (let progress = 0; progress <= 100; progress += 10) {
-      setTimeout(async () => {
-        try {
-          await axios.put(`${API}/downloads/${downloadId}/progress`, {
-            progress,
-            status: progress === 100 ? 'completed' : 'downloading'
-          });
-          fetchDownloads();
-        } catch (error) {
-          console.error('Error updating progress:', error);
-        }
-      }, progress * 100);
-    }
-  };
-
   const cancelDownload = async (downloadId) => {
     try {
       await axios.delete(`${API}/downloads/${downloadId}`);
@@ -14,6 +14,17 @@ const ProfessionalDownloadManager = () => {
 
   useEffect(() => {
     fetchDownloads();
+
+    // The server runs downloads and pushes their progress as server-sent events
+    const source = new EventSource(`${API}/stream/downloads`);
+    source.addEventListener('progress', (event) => {
+      const update = JSON.parse(event.data);
+      setDownloads(current => current.map(download =>
+        download.id === update.id ? { ...download, ...update } : download
+      ));
+    });
+
+    return () => source.close();
   }, []);
 
   const fetchDownloads = async () => {
@@ -36,29 +47,12 @@ const ProfessionalDownloadManager = () => {
         setNewDownload({ url: '', filename: '', category: 'documents' });
         setShowAddForm(false);
         fetchDownloads();
-        simulateDownloadProgress(response.data.download_id);
       }
     } catch (error) {
       console.error('Error starting download:', error);
     }
   };
 
-  const simulateDownloadProgress = async (downloadId) => {
-    for (let progress = 0; progress <= 100; progress += Math.random() * 15 + 5) {
-      setTimeout(async () => {
-        try {
-          await axios.put(`${API}/downloads/${downloadId}/progress`, {
-            progress: Math.min(progress, 100),
-            status: progress >= 100 ? 'completed' : 'downloading'
-          });
-          fetchDownloads();
-        } catch (error) {
-          console.error('Error updating progress:', error);
-        }
-      }, progress * 50);
-    }
-  };
-
   const cancelDownload = async (downloadId) => {
     try {
       await axios.delete(`${API}/downloads/${downloadId}`);
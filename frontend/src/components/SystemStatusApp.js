@@ -27,9 +27,26 @@ const SystemStatusApp = () => {
     };
 
     fetchStats();
-    const interval = setInterval(fetchStats, 5000); // Update every 5 seconds
 
-    return () => clearInterval(interval);
+    // Stats are pushed over server-sent events; fall back to polling if the stream is unavailable
+    let interval = null;
+    const source = new EventSource(`${API}/stream/system`);
+    source.addEventListener('stats', (event) => {
+      const data = JSON.parse(event.data);
+      setSystemStats(data.performance);
+      setDashboardStats(data.dashboard);
+      setLoading(false);
+    });
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED && !interval) {
+        interval = setInterval(fetchStats, 5000); // Update every 5 seconds
+      }
+    };
+
+    return () => {
+      source.close();
+      if (interval) clearInterval(interval);
+    };
   }, []);
 
   const getStatusColor = (value, thresholds = { good: 50, warning: 80 }) => {